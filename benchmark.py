@@ -0,0 +1,219 @@
+from dataclasses import dataclass, asdict
+import multiprocessing
+import subprocess
+import threading
+import argparse
+import platform
+import resource
+import logging
+import random
+import json
+import time
+import os
+
+from jumpcutter import JumpCutter, deletePath
+
+# Generated inputs are deterministic, so they are only made once and kept here.
+MEDIA_FOLDER = os.environ.get("JUMPCUTTER_BENCH_MEDIA", os.path.join(os.path.expanduser("~"),".cache","jumpcutter","bench"))
+REAL_WORLD_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)),"orignal-video.mp4")
+
+@dataclass
+class BenchCase:
+    name: str
+    duration: float # seconds
+    frameRate: str # anything ffmpeg takes as a rate, e.g. "30000/1001"
+    width: int
+    height: int
+    sampleRate: int = 44100
+    seed: int = 0 # picks the speech/silence pattern
+    path: str = None # an existing file instead of generated media
+
+CASES = [
+    BenchCase("short-30fps-360p", 20, "30", 640, 360),
+    BenchCase("medium-25fps-720p", 60, "25", 1280, 720, seed=1),
+    BenchCase("medium-ntsc-480p", 60, "30000/1001", 854, 480, sampleRate=48000, seed=2),
+    BenchCase("long-30fps-360p", 300, "30", 640, 360, seed=3),
+    BenchCase("real-world", None, None, None, None, path=REAL_WORLD_INPUT),
+]
+
+def speechPattern(duration,seed):
+    # Alternating (seconds, sounded) runs that look roughly like someone talking:
+    # bursts of 0.5-4 s of speech separated by 0.2-2 s pauses.
+    rng = random.Random(seed)
+    pattern = []
+    total = 0.0
+    sounded = True
+    while total < duration:
+        length = min(round(rng.uniform(0.5,4.0) if sounded else rng.uniform(0.2,2.0),2), round(duration-total,2))
+        if length <= 0:
+            break
+        pattern.append((length,sounded))
+        total += length
+        sounded = not sounded
+    return pattern
+
+def buildSourceGraph(case):
+    # testsrc for the picture, a sine tone for speech and anullsrc for silence.
+    pattern = speechPattern(case.duration,case.seed)
+    filters = [f"testsrc=size={case.width}x{case.height}:rate={case.frameRate}:duration={case.duration}[outv]"]
+    for i, (length, sounded) in enumerate(pattern):
+        if sounded:
+            filters.append(f"sine=frequency={220+110*(i%4)}:sample_rate={case.sampleRate}:duration={length}[a{i}]")
+        else:
+            filters.append(f"anullsrc=channel_layout=mono:sample_rate={case.sampleRate},atrim=duration={length}[a{i}]")
+    filters.append(f"{''.join(f'[a{i}]' for i in range(len(pattern)))}concat=n={len(pattern)}:v=0:a=1[outa]")
+    return ";\n".join(filters)
+
+def makeInput(case,mediaFolder=MEDIA_FOLDER):
+    # Returns the path of the case's input, generating it first if needed.
+    if case.path is not None:
+        return case.path
+    path = os.path.join(mediaFolder,f"{case.name}.mp4")
+    if os.path.exists(path):
+        return path
+    os.makedirs(mediaFolder,exist_ok=True)
+    logging.info(f"Generating {path}...")
+    graphFile = path+".graph.txt"
+    partialFile = path+".partial.mp4"
+    with open(graphFile, "w") as f:
+        f.write(buildSourceGraph(case))
+    try:
+        subprocess.run(["ffmpeg","-y","-filter_complex_script",graphFile,"-map","[outv]","-map","[outa]","-c:v","libx264","-preset","veryfast",
+            "-pix_fmt","yuv420p","-c:a","aac","-fflags","+bitexact","-map_metadata","-1","-hide_banner","-loglevel","error",partialFile], check=True)
+        os.replace(partialFile,path)
+    finally:
+        deletePath(graphFile)
+        if os.path.exists(partialFile):
+            os.remove(partialFile)
+    return path
+
+def folderBytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root,name))
+            except OSError: # deleted while walking
+                pass
+    return total
+
+class DiskWatcher(threading.Thread):
+    # Polls the size of a folder in the background and remembers the largest one seen.
+    def __init__(self, path, interval=0.2):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.peakBytes = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peakBytes = max(self.peakBytes,folderBytes(self.path))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.peakBytes = max(self.peakBytes,folderBytes(self.path))
+
+def runCase(inputFile,settings,scratchFolder):
+    # Runs in a fresh process, so the rusage numbers belong to this case alone.
+    # ffmpeg does most of the work, so its children's CPU time and memory count too.
+    # Only jumpcutter's temp folders are watched, the output next to them is not temporary
+    outputFile = os.path.join(scratchFolder,"output.mp4")
+    workFolder = os.path.join(scratchFolder,"work")
+    os.makedirs(workFolder,exist_ok=True)
+    jumpCutter = JumpCutter(scratchFolder=workFolder, **settings)
+    watcher = DiskWatcher(workFolder)
+    watcher.start()
+    startTimes = os.times()
+    startWall = time.perf_counter()
+    try:
+        result = jumpCutter.run(inputFile, outputFile)
+    finally:
+        wall = time.perf_counter()-startWall
+        endTimes = os.times()
+        watcher.stop()
+    selfUsage = resource.getrusage(resource.RUSAGE_SELF)
+    childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "wall": wall,
+        "cpu": (endTimes.user-startTimes.user)+(endTimes.system-startTimes.system),
+        "childCpu": (endTimes.children_user-startTimes.children_user)+(endTimes.children_system-startTimes.children_system),
+        "peakRssKb": selfUsage.ru_maxrss, # kilobytes on Linux
+        "peakChildRssKb": childUsage.ru_maxrss, # the largest single ffmpeg
+        "peakTempBytes": watcher.peakBytes,
+        "outputBytes": os.path.getsize(result.outputFile),
+        "chunks": len(result.chunks),
+        "stages": result.timings,
+    }
+
+def benchmark(cases,settings,repeat=1,mediaFolder=MEDIA_FOLDER,scratchFolder=None):
+    """
+    Runs every case repeat times, each in its own process and scratch folder.
+
+    Returns:
+        list: One dict per run with the case, the settings and the measurements.
+    """
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for case in cases:
+        inputFile = makeInput(case,mediaFolder)
+        if not os.path.exists(inputFile):
+            logging.warning(f"Skipping {case.name}, {inputFile} not found.")
+            continue
+        for i in range(repeat):
+            logging.info(f"Running {case.name} ({i+1}/{repeat})...")
+            caseScratch = os.path.join(scratchFolder or mediaFolder,f"scratch-{case.name}-{os.getpid()}")
+            os.makedirs(caseScratch,exist_ok=True)
+            try:
+                with context.Pool(1) as pool:
+                    measurements = pool.apply(runCase,(inputFile,settings,caseScratch))
+            finally:
+                deletePath(caseScratch)
+            runs.append({"case": asdict(case), "repeat": i, "settings": settings, **measurements})
+    return runs
+
+def environmentInfo():
+    def firstLine(command):
+        try:
+            return subprocess.run(command, capture_output=True, text=True).stdout.splitlines()[0]
+        except Exception:
+            return None
+    return {
+        "commit": firstLine(["git","-C",os.path.dirname(os.path.abspath(__file__)),"rev-parse","HEAD"]),
+        "ffmpeg": firstLine(["ffmpeg","-version"]),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Times jumpcutter.py stage by stage on generated test videos and writes the results as JSON.')
+    parser.add_argument('--output_file', type=str, default="benchmark.json", help="where to write the results")
+    parser.add_argument('--cases', type=str, default=None, help=f"comma-separated case names to run. (optional. defaults to all of {', '.join(case.name for case in CASES)})")
+    parser.add_argument('--repeat', type=int, default=1, help="how many times to run every case")
+    parser.add_argument('--media_dir', type=str, default=MEDIA_FOLDER, help="where generated inputs are kept between runs")
+    parser.add_argument('--scratch_dir', type=str, default=None, help="where the runs' temporary folders go. (optional. defaults to --media_dir)")
+    parser.add_argument('--settings', type=str, default="{}", help="JumpCutter settings as JSON, e.g. '{\"renderer\": \"pipe\", \"workers\": 4}'")
+    args = parser.parse_args()
+
+    cases = CASES
+    if args.cases:
+        names = [name.strip() for name in args.cases.split(",")]
+        unknown = set(names)-{case.name for case in CASES}
+        if unknown:
+            parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+        cases = [case for case in CASES if case.name in names]
+
+    runs = benchmark(cases, json.loads(args.settings), args.repeat, args.media_dir, args.scratch_dir)
+    with open(args.output_file, "w") as f:
+        json.dump({"environment": environmentInfo(), "runs": runs}, f, indent=2)
+    for run in runs:
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in run["stages"].items())
+        logging.info(f"{run['case']['name']}: {run['wall']:.2f}s wall, {run['cpu']+run['childCpu']:.2f}s cpu ({stages})")
+    logging.info(f"Wrote {args.output_file}")
+
+if __name__ == "__main__":
+    main()
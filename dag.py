@@ -0,0 +1,127 @@
+import asyncio
+import inspect
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class DagError(Exception):
+    def __init__(self, node: str, error: BaseException):
+        super().__init__(f"{node}: {error}")
+        self.node = node
+        self.error = error
+
+
+@dataclass
+class Node:
+    name: str
+    func: Callable
+    deps: Tuple[str, ...]
+    blocking: bool = False  # run in a thread (or executor) instead of on the event loop
+    executor: Optional[Executor] = None  # e.g. a ProcessPoolExecutor for CPU-bound, picklable functions
+    started: Optional[float] = None  # seconds since the run started
+    finished: Optional[float] = None
+
+
+@dataclass
+class Dag:
+    """
+    Runs a set of pipeline steps as soon as the steps they depend on are done,
+    so independent steps overlap and a run takes as long as its critical path
+    rather than the sum of all steps.
+
+    Every step gets its dependencies' results as positional arguments, in the
+    order the dependencies were listed. Steps can be coroutine functions, which
+    run on the event loop, or blocking functions, which run in a thread or in
+    the given executor. A blocking step that returns a coroutine (like a
+    crewAI flow method with blocking code inside) has it run to completion in
+    that thread.
+    """
+
+    nodes: Dict[str, Node] = field(default_factory=dict)
+
+    def add(self, name: str, func: Callable, *deps: str, blocking: bool = False, executor: Optional[Executor] = None) -> str:
+        for dep in deps:
+            if dep not in self.nodes:
+                raise ValueError(f"{name} depends on {dep}, which hasn't been added yet")
+        self.nodes[name] = Node(name, func, deps, blocking or executor is not None, executor)
+        return name
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Runs every step once.
+
+        Returns:
+            dict: Every step's result by name.
+
+        Raises:
+            DagError: For the first step that fails. Steps still running are cancelled.
+        """
+        start = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_node(node: Node):
+            args = [await tasks[dep] for dep in node.deps]
+            node.started = time.perf_counter() - start
+            try:
+                return await self._call(node, args)
+            except Exception as e:
+                raise DagError(node.name, e) from e
+            finally:
+                node.finished = time.perf_counter() - start
+
+        # Nodes can only depend on nodes added before them, so this order works
+        for node in self.nodes.values():
+            tasks[node.name] = asyncio.ensure_future(run_node(node))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: task.result() for name, task in tasks.items()}
+
+    async def _call(self, node: Node, args: List[Any]):
+        if not node.blocking:
+            result = node.func(*args)
+            return await result if inspect.isawaitable(result) else result
+        loop = asyncio.get_running_loop()
+        if node.executor is not None:
+            return await loop.run_in_executor(node.executor, node.func, *args)
+        return await asyncio.to_thread(_call_blocking, node.func, args)
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        """Start, finish and duration of every step that ran, in seconds since the run started."""
+        return {
+            node.name: {"started": node.started, "finished": node.finished, "seconds": node.finished - node.started}
+            for node in self.nodes.values()
+            if node.finished is not None
+        }
+
+    def critical_path(self) -> List[str]:
+        """The chain of steps that finished last, each waiting on the dependency that finished last."""
+        finished = [node for node in self.nodes.values() if node.finished is not None]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda node: node.finished)]
+        while path[-1].deps:
+            path.append(max((self.nodes[dep] for dep in path[-1].deps), key=lambda node: node.finished))
+        return [node.name for node in reversed(path)]
+
+    def report(self) -> Dict[str, Any]:
+        timings = self.timings()
+        return {
+            "nodes": timings,
+            "wall_seconds": max((t["finished"] for t in timings.values()), default=0.0),
+            "sum_seconds": sum(t["seconds"] for t in timings.values()),
+            "critical_path": self.critical_path(),
+        }
+
+
+def _call_blocking(func: Callable, args: List[Any]):
+    result = func(*args)
+    if inspect.iscoroutine(result):
+        return asyncio.run(result)
+    return result
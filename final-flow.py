@@ -4,6 +4,7 @@ import subprocess
 import os
 from openai import OpenAI
 import cv2
+from transcription import get_transcription_service
 
 load_dotenv()
 from crewai.flow.flow import Flow, listen, start
@@ -23,9 +24,8 @@ class ExampleFlow(Flow):
     async def transcribe_video(self, video_path):
         print("Transcribing video...")
         try:
-            import whisper
-            model = whisper.load_model("base")
-            result = model.transcribe(video_path)
+            # Loaded once per process and shared by every transcription
+            result = get_transcription_service().transcribe(video_path)
             text = result["text"]
             self.state["transcript"] = text
             return text
@@ -115,9 +115,6 @@ class ExampleFlow(Flow):
             return None
 
 
-flow = ExampleFlow()
-flow.plot()
-
 async def main():
     video_path = await flow.video_path()
     transcript = await flow.transcribe_video(video_path)
@@ -125,4 +122,8 @@ async def main():
     await flow.post_to_database(blog_post)
 
 
-asyncio.run(main())
+# Guarded, because segmented transcription starts worker processes that import this file
+if __name__ == "__main__":
+    flow = ExampleFlow()
+    flow.plot()
+    asyncio.run(main())
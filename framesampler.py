@@ -0,0 +1,121 @@
+import math
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from jumpcutter import probeMedia
+
+SCENE_SCORE_PATTERN = re.compile(r"pts_time:([0-9.]+).*?lavfi\.scene_score=([0-9.]+)", re.DOTALL)
+
+
+def interval_timestamps(duration: float, interval_seconds: float) -> List[float]:
+    """One timestamp every interval_seconds, starting at 0 and staying inside the video."""
+    return [i * interval_seconds for i in range(max(1, math.ceil(duration / interval_seconds)))]
+
+
+def detect_scenes(
+    video_path: str, threshold: float = 0.3, height: int = 180, keyframes_only: bool = True
+) -> List[Tuple[float, float]]:
+    """
+    Finds scene changes in one low-resolution ffmpeg pass.
+
+    Args:
+        threshold (float): Minimum ffmpeg scene score (0 to 1) for a frame to count.
+        height (int): Height frames are scaled to before they are compared.
+        keyframes_only (bool): Only decode keyframes. Encoders put keyframes on
+            scene cuts, so this finds most of them at a fraction of the cost.
+
+    Returns:
+        list: (seconds, score) of every scene change, in order.
+    """
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    if keyframes_only:
+        command += ["-skip_frame", "nokey"]
+    command += [
+        "-i", video_path, "-an",
+        "-vf", f"scale=-2:{height},select='gt(scene,{threshold})',metadata=print:file=-",
+        "-f", "null", "-",
+    ]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    # metadata=print writes a "frame:... pts_time:..." line followed by the frame's keys
+    return [(float(time), float(score)) for time, score in SCENE_SCORE_PATTERN.findall(output)]
+
+
+def pick_scene_timestamps(scenes: List[Tuple[float, float]], max_photos: Optional[int], min_gap: float) -> List[float]:
+    """Keeps the highest scoring scene changes that are at least min_gap seconds apart, in time order."""
+    picked: List[float] = []
+    for time, _ in sorted(scenes, key=lambda scene: -scene[1]):
+        if max_photos is not None and len(picked) >= max_photos:
+            break
+        if all(abs(time - other) >= min_gap for other in picked):
+            picked.append(time)
+    return sorted(picked)
+
+
+def extract_frame(video_path: str, seconds: float, photo_path: str):
+    # -ss before -i seeks to the keyframe before the timestamp and only decodes from there
+    subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-ss", f"{seconds:.3f}", "-i", video_path,
+         "-frames:v", "1", "-q:v", "2", photo_path],
+        check=True,
+    )
+
+
+def sample_frames(
+    video_path: str,
+    output_dir: str,
+    interval_seconds: float = 10,
+    mode: str = "interval",
+    max_photos: Optional[int] = None,
+    scene_threshold: float = 0.3,
+    workers: int = 4,
+) -> List[str]:
+    """
+    Saves still frames from a video as JPEGs by seeking straight to them, so the
+    work grows with the number of photos rather than the length of the video.
+
+    Args:
+        video_path (str): Path to the video file.
+        output_dir (str): Folder for the photos, named frame<frame number>.jpg.
+        interval_seconds (float): Time between photos in "interval" mode, and
+            the minimum time between them in "scene" mode.
+        mode (str): "interval" for one photo every interval_seconds, "scene" for
+            the frames right after the biggest scene changes. Falls back to
+            "interval" if no scene changes are found.
+        max_photos (int): Upper limit on the number of photos. Optional.
+        scene_threshold (float): Minimum scene score in "scene" mode, from 0 to 1.
+        workers (int): Frames extracted at the same time.
+
+    Returns:
+        list: Paths to the saved photos, in time order.
+    """
+    if mode not in ("interval", "scene"):
+        raise ValueError(f"unknown frame sampling mode '{mode}'")
+    media_info = probeMedia(video_path)
+    if media_info.duration is None:
+        raise ValueError(f"could not find the duration of {video_path}")
+    fps = float(media_info.frameRate) if media_info.frameRate else 30.0
+    # The container's duration is its longest stream's, and audio often runs on a
+    # little past the last frame. Seeking beyond that frame writes no photo at all.
+    if media_info.videoDuration:
+        video_duration = media_info.videoDuration
+    elif media_info.frameCount and media_info.frameRate:
+        video_duration = media_info.frameCount / float(media_info.frameRate)
+    else:
+        video_duration = media_info.duration
+
+    timestamps: List[float] = []
+    if mode == "scene":
+        timestamps = pick_scene_timestamps(detect_scenes(video_path, scene_threshold), max_photos, interval_seconds)
+    if not timestamps:
+        # up to the start of the last frame
+        timestamps = interval_timestamps(video_duration - 1 / fps, interval_seconds)[:max_photos]
+
+    os.makedirs(output_dir, exist_ok=True)
+    photo_paths = [os.path.join(output_dir, f"frame{int(round(seconds * fps))}.jpg") for seconds in timestamps]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(extract_frame, [video_path] * len(timestamps), timestamps, photo_paths))
+    # ffmpeg still exits 0 when a seek lands past the last frame
+    return [photo_path for photo_path in photo_paths if os.path.isfile(photo_path)]
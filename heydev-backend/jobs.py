@@ -0,0 +1,142 @@
+import asyncio
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = "queued"  # queued, running, done or failed
+    stage: Optional[str] = None  # the stage a running job is in or waiting for
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    info: Dict[str, Any] = field(default_factory=dict)  # whatever the submitter wants reported, e.g. the upload's hash
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobQueue:
+    """
+    Runs jobs on a fixed number of worker tasks, so the event loop stays free to
+    accept uploads and answer status requests while videos are being processed.
+
+    Blocking work goes through run_stage(), which hands it to a thread and caps
+    how many jobs can be in the same stage at once. CPU-heavy stages like
+    transcription get a low limit, I/O-bound ones like the LLM call a high one.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queued: int = 16,
+        stage_limits: Optional[Dict[str, int]] = None,
+        retention: float = 3600,
+        on_forget: Optional[Callable[[Job], None]] = None,
+    ):
+        self.workers = workers
+        self.stage_limits = stage_limits or {}
+        self.retention = retention  # seconds a finished job stays around for /jobs
+        self.on_forget = on_forget  # called with every job dropped after retention, e.g. to delete its files
+        self.jobs: Dict[str, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks = []
+
+    def start(self):
+        """Starts the worker tasks. Needs a running event loop."""
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, run: Callable[["Job"], Awaitable[Dict[str, Any]]], info: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        Queues run(job) and returns the job straight away.
+
+        Args:
+            run: Coroutine function doing the work. Its return value becomes job.result.
+            info: Reported as job.info.
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting.
+        """
+        self._forget_old_jobs()
+        job = Job(id=uuid.uuid4().hex, info=info or {})
+        try:
+            self._queue.put_nowait((job, run))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self._queue.maxsize} jobs are already waiting")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def run_stage(self, job: Job, stage: str, func: Callable, *args, **kwargs):
+        """
+        Runs the blocking func(*args, **kwargs) in a thread once fewer than the
+        stage's limit of jobs are running it. Stages without a limit run freely.
+        """
+        job.stage = stage
+        limit = self.stage_limits.get(stage)
+        if limit is None:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        if stage not in self._semaphores:
+            self._semaphores[stage] = asyncio.Semaphore(limit)
+        async with self._semaphores[stage]:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def _worker(self):
+        while True:
+            job, run = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await run(job)
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "cancelled"
+                raise
+            except Exception as e:
+                print(f"Job {job.id} failed in stage {job.stage}: {e}")
+                job.status = "failed"
+                job.error = f"{job.stage}: {e}" if job.stage else str(e)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _forget_old_jobs(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self.jobs[job_id]
+                if self.on_forget is not None:
+                    try:
+                        self.on_forget(job)
+                    except Exception as e:
+                        print(f"Could not clean up job {job_id}: {e}")
+
+
+def parse_stage_limits(value: str) -> Dict[str, int]:
+    """Parses "transcribe=1,blog_post=8" into {"transcribe": 1, "blog_post": 8}."""
+    limits = {}
+    for item in value.split(","):
+        if item.strip():
+            stage, _, limit = item.partition("=")
+            limits[stage.strip()] = int(limit)
+    return limits
@@ -1,94 +1,167 @@
 import asyncio
+import hashlib
+import json
 import os
-import subprocess
-from typing import List
+import re
+import shutil
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
 
-import cv2
+import numpy as np
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse
 from openai import OpenAI
 
+# jumpcutter.py lives in the repository root, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jumpcutter import inputToOutputFilename, jumpcut
+from dag import Dag
+from framesampler import sample_frames
+from transcription import WHISPER_SAMPLE_RATE, get_transcription_service
+
+from jobs import Job, JobQueue, QueueFullError, parse_stage_limits
+from resultcache import ResultCache, make_key
+
 load_dotenv()
 
-app = FastAPI()
+# Every job writes its photos and HTML into its own folder in here, which is
+# deleted along with the job's record once /jobs stops reporting it
+OUTPUT_ROOT = os.getenv("OUTPUT_ROOT", "jobs")
 
+# Uploads are copied to disk this many bytes at a time, whatever their size
+UPLOAD_CHUNK_SIZE = 1 << 20
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(4 << 30)))
 
-async def video_to_blog_post(video_path: str) -> str:
-    """
-    Orchestrates the process of converting a video into a blog post.
+# Pipeline parameters. Every cached output is keyed by the ones it depends on.
+JUMPCUT_SETTINGS: Dict = {}  # passed to jumpcut(), e.g. {"silentSpeed": 8}
+LLM_MODEL = "gpt-4o-mini"
+BLOG_PROMPT = "Create a blog post from the following transcript: {transcript}"
+BLOG_MAX_TOKENS = 1024
+PHOTO_INTERVAL_SECONDS = 10
+PHOTO_MODE = os.getenv("PHOTO_MODE", "interval")  # or "scene" for photos right after scene changes
+PHOTO_MAX_COUNT: Optional[int] = None
 
-    Args:
-        video_path (str): Path to the video file.
+result_cache = ResultCache(
+    os.getenv("RESULT_CACHE_DIR", "cache"),
+    max_bytes=int(os.getenv("RESULT_CACHE_BYTES", str(20 << 30))),
+)
 
-    Returns:
-        str: Path to the generated HTML blog post.
+# Transcription and jumpcutting are CPU-heavy, the LLM call only waits on the network
+DEFAULT_STAGE_LIMITS = "shorten=1,transcribe=1,blog_post=8,photos=2,html=8"
+
+job_queue = JobQueue(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queued=int(os.getenv("JOB_QUEUE_SIZE", "16")),
+    stage_limits=parse_stage_limits(os.getenv("STAGE_LIMITS", DEFAULT_STAGE_LIMITS)),
+    on_forget=lambda job: shutil.rmtree(os.path.join(OUTPUT_ROOT, job.id), ignore_errors=True),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load Whisper before taking requests, so no job pays for it
+    await asyncio.to_thread(get_transcription_service().warm_up)
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    get_transcription_service().close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def reject_large_uploads(request: Request, call_next):
+    # Turn away uploads that announce their size before any of the body is read.
+    # Chunked uploads without a length are checked in save_upload instead.
+    content_length = request.headers.get("content-length")
+    if request.url.path == "/upload" and content_length:
+        try:
+            announced = int(content_length)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"detail": "Invalid Content-Length header"})
+        if announced > MAX_UPLOAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes"})
+    return await call_next(request)
+
+
+async def save_upload(video: UploadFile, video_path: str) -> dict:
     """
+    Copies an upload to video_path in UPLOAD_CHUNK_SIZE pieces, hashing it on
+    the way, so memory use doesn't grow with the file.
 
-    print("Starting video to blog post process...")
+    Returns:
+        dict: The upload's sha256 as content_hash and its size in bytes.
 
-    # Shorten video
-    print("Shortening video...")
+    Raises:
+        HTTPException: 413 if the upload is bigger than MAX_UPLOAD_BYTES.
+    """
+    digest = hashlib.sha256()
+    size = 0
     try:
-        command = f"python jumpcutter.py --input_file {video_path} --output_file shortened_video.mp4"
-        subprocess.run(command, shell=True, check=True)
-        shortened_video_path = "shortened_video.mp4"
-    except Exception as e:
-        print(f"Error shortening video: {e}")
-        return None
+        with open(video_path, "wb") as f:
+            while True:
+                chunk = await video.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+        raise
+    return {"content_hash": digest.hexdigest(), "size": size}
 
-    # Transcribe video
-    print("Transcribing video...")
-    try:
-        import whisper
 
-        model = whisper.load_model("base")
-        result = model.transcribe(shortened_video_path)
-        transcript = result["text"]
-    except Exception as e:
-        print(f"Error transcribing video: {e}")
-        return None
+def shorten_video(video_path: str) -> Tuple[str, Optional[np.ndarray], str]:
+    # Next to the upload rather than a fixed name, so concurrent jobs don't collide.
+    # The new audio comes back ready for Whisper, so it never decodes the output again.
+    result = jumpcut(video_path, inputToOutputFilename(video_path), returnAudioRate=WHISPER_SAMPLE_RATE, **JUMPCUT_SETTINGS)
+    # Where speech pauses in the output, kept with it so segmented transcription can cut there
+    pauses_path = os.path.splitext(result.outputFile)[0] + "_pauses.json"
+    with open(pauses_path, "w") as f:
+        json.dump(result.pauses.tolist(), f)
+    return result.outputFile, result.audio, pauses_path
 
-    # Create blog post
-    print("Creating blog post...")
-    try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = client.completions.create(
-            model="gpt-4o-mini",
-            prompt=f"Create a blog post from the following transcript: {transcript}",
-            max_tokens=1024,
-        )
-        blog_post = response.choices[0].text
-    except Exception as e:
-        print(f"Error creating blog post: {e}")
-        return None
 
-    # Generate photos
-    print("Generating photos...")
-    output_dir = "photos"
-    os.makedirs(output_dir, exist_ok=True)
-    try:
-        vidcap = cv2.VideoCapture(video_path)
-        fps = vidcap.get(cv2.CAP_PROP_FPS)
-        frame_interval = int(fps * 10)  # Extract one frame every 10 seconds
-        success, image = vidcap.read()
-        count = 0
-        photo_paths: List[str] = []
-        while success:
-            if count % frame_interval == 0:
-                photo_path = os.path.join(output_dir, f"frame{count}.jpg")
-                cv2.imwrite(photo_path, image)
-                photo_paths.append(photo_path)
-            success, image = vidcap.read()
-            count += 1
-    except Exception as e:
-        print(f"Error generating photos: {e}")
+def load_pauses(pauses_path: Optional[str]) -> Optional[List[float]]:
+    if pauses_path is None:  # cached before pauses were stored
         return None
+    with open(pauses_path, "r") as f:
+        return json.load(f)
 
-    # Create HTML blog post
-    print("Creating HTML blog post...")
-    try:
-        html_content = f"""
+
+def transcribe_video(audio, pauses: Optional[List[float]] = None) -> str:
+    # audio is a 16 kHz mono array or a path to a video for Whisper to decode itself
+    result = get_transcription_service().transcribe(audio, pauses=pauses)
+    return result["text"]
+
+
+def create_blog_post(transcript: str) -> str:
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    response = client.completions.create(
+        model=LLM_MODEL,
+        prompt=BLOG_PROMPT.format(transcript=transcript),
+        max_tokens=BLOG_MAX_TOKENS,
+    )
+    return response.choices[0].text
+
+
+def generate_photos(video_path: str, output_dir: str) -> List[str]:
+    # Seeks to each photo instead of decoding the whole video
+    return sample_frames(video_path, output_dir, PHOTO_INTERVAL_SECONDS, mode=PHOTO_MODE, max_photos=PHOTO_MAX_COUNT)
+
+
+def create_html(blog_post: str, photo_paths: List[str], html_file_path: str) -> str:
+    # Image paths are relative to the HTML file, which sits next to the photos folder
+    html_dir = os.path.dirname(html_file_path)
+    html_content = f"""
         <!DOCTYPE html>
         <html>
         <head>
@@ -98,53 +171,207 @@ async def video_to_blog_post(video_path: str) -> str:
             <p>{blog_post}</p>
             <h2>Photos</h2>
             <div>
-                {''.join([f'<img src="{path}" alt="Video Frame" width="300">' for path in photo_paths])}
+                {''.join([f'<img src="{os.path.relpath(path, html_dir)}" alt="Video Frame" width="300">' for path in photo_paths])}
             </div>
         </body>
         </html>
         """
+    with open(html_file_path, "w") as f:
+        f.write(html_content)
+    return html_file_path
 
-        html_file_path = "video_blog_post.html"
-        with open(html_file_path, "w") as f:
-            f.write(html_content)
 
-        print(f"Generated HTML blog post: {html_file_path}")
-        return html_file_path
-    except Exception as e:
-        print(f"Error creating HTML blog post: {e}")
-        return None
+def link_files(files: Dict[str, str], output_dir: str) -> Dict[str, str]:
+    # Hard-links cached files into a job's folder, keeping their names (and subfolders),
+    # so a cache hit takes no extra disk space and the job's files outlive an eviction.
+    # Falls back to copying where the cache is on another filesystem.
+    links = {}
+    for name, path in files.items():
+        links[name] = os.path.join(output_dir, name)
+        os.makedirs(os.path.dirname(links[name]), exist_ok=True)
+        try:
+            os.link(path, links[name])
+        except OSError:
+            shutil.copyfile(path, links[name])
+    return links
 
 
-@app.post("/upload")
-async def upload_video(video: UploadFile = File(...)):
+async def video_to_blog_post(video_path: str, job: Job) -> str:
     """
-    Endpoint for uploading a video and converting it to a blog post.
+    Orchestrates the process of converting a video into a blog post. Every step
+    runs through the job queue, off the event loop and within its stage's limit.
+
+    Steps that don't depend on each other run at the same time, and their
+    timings end up in job.info["timings"]. Every stage's output is cached under
+    the upload's content hash and the parameters it was made with, so repeated
+    uploads skip the work, and e.g. a new prompt only reruns the blog post and HTML.
 
     Args:
-        video (UploadFile): The uploaded video file.
+        video_path (str): Path to the video file.
+        job (Job): The job this runs for. job.info["content_hash"] must be the
+            video's sha256. Outputs go to OUTPUT_ROOT/<job id>.
 
     Returns:
-        HTMLResponse: An HTML response displaying the generated blog post.
+        str: Path to the generated HTML blog post.
     """
+
+    print(f"Starting video to blog post process for job {job.id}...")
+    output_dir = os.path.join(OUTPUT_ROOT, job.id)
+    content_hash = job.info["content_hash"]
+    shorten_key = make_key(content_hash, "shorten", JUMPCUT_SETTINGS)
+    transcript_key = make_key(
+        shorten_key, "transcribe", get_transcription_service().model_name, get_transcription_service().processes
+    )
+    blog_key = make_key(transcript_key, "blog_post", LLM_MODEL, BLOG_PROMPT, BLOG_MAX_TOKENS)
+    photos_key = make_key(content_hash, "photos", PHOTO_INTERVAL_SECONDS, PHOTO_MODE, PHOTO_MAX_COUNT)
+    html_key = make_key(blog_key, photos_key, "html")
+    cached_stages = job.info.setdefault("cached_stages", [])
+
+    html_files = result_cache.get_files(html_key)
+    if html_files is not None:
+        print("Using cached HTML blog post...")
+        cached_stages.append("html")
+        return (await asyncio.to_thread(link_files, html_files, output_dir))["video_blog_post.html"]
+
+    async def get_transcript():
+        transcript = result_cache.get_text(transcript_key)
+        if transcript is not None:
+            cached_stages.append("transcribe")
+            return transcript
+        shortened = result_cache.get_files(shorten_key)
+        if shortened is not None:
+            cached_stages.append("shorten")
+            audio = shortened["shortened.mp4"]
+        else:
+            print("Shortening video...")
+            shortened_video_path, audio, pauses_path = await job_queue.run_stage(job, "shorten", shorten_video, video_path)
+            shortened = await asyncio.to_thread(
+                result_cache.put_files,
+                shorten_key,
+                {"shortened.mp4": shortened_video_path, "pauses.json": pauses_path},
+                move=True,
+            )
+            if audio is None:
+                audio = shortened["shortened.mp4"]
+        pauses = load_pauses(shortened.get("pauses.json"))
+        print("Transcribing video...")
+        transcript = await job_queue.run_stage(job, "transcribe", transcribe_video, audio, pauses)
+        await asyncio.to_thread(result_cache.put_text, transcript_key, transcript)
+        return transcript
+
+    async def get_blog_post(transcript: str):
+        blog_post = result_cache.get_text(blog_key)
+        if blog_post is not None:
+            cached_stages.append("blog_post")
+            return blog_post
+        print("Creating blog post...")
+        blog_post = await job_queue.run_stage(job, "blog_post", create_blog_post, transcript)
+        await asyncio.to_thread(result_cache.put_text, blog_key, blog_post)
+        return blog_post
+
+    async def get_photos():
+        photo_files = result_cache.get_files(photos_key)
+        if photo_files is not None:
+            cached_stages.append("photos")
+            return list((await asyncio.to_thread(link_files, photo_files, os.path.join(output_dir, "photos"))).values())
+        print("Generating photos...")
+        photo_paths = await job_queue.run_stage(job, "photos", generate_photos, video_path, os.path.join(output_dir, "photos"))
+        await asyncio.to_thread(result_cache.put_files, photos_key, {os.path.basename(path): path for path in photo_paths})
+        return photo_paths
+
+    async def get_html(blog_post: str, photo_paths: List[str]):
+        print("Creating HTML blog post...")
+        html_file_path = await job_queue.run_stage(
+            job, "html", create_html, blog_post, photo_paths, os.path.join(output_dir, "video_blog_post.html")
+        )
+        html_files = {"video_blog_post.html": html_file_path}
+        html_files.update({f"photos/{os.path.basename(path)}": path for path in photo_paths})
+        await asyncio.to_thread(result_cache.put_files, html_key, html_files)
+        return html_file_path
+
+    # Photos come from the original video, so they are made while the video is
+    # shortened, transcribed and written up
+    dag = Dag()
+    dag.add("transcript", get_transcript)
+    dag.add("blog_post", get_blog_post, "transcript")
+    dag.add("photos", get_photos)
+    dag.add("html", get_html, "blog_post", "photos")
     try:
-        # Save the uploaded video to a temporary file
-        video_path = f"temp_{video.filename}"
-        with open(video_path, "wb") as f:
-            f.write(await video.read())
+        results = await dag.run()
+    finally:
+        job.info["timings"] = dag.report()
+    print(f"Generated HTML blog post: {results['html']}")
+    return results["html"]
 
-        # Process the video and generate the HTML blog post
-        html_path = await video_to_blog_post(video_path)
 
-        # Read the HTML content and return it as a response
+async def process_upload(video_path: str, job: Job) -> dict:
+    try:
+        html_path = await video_to_blog_post(video_path, job)
         with open(html_path, "r") as f:
             html_content = f.read()
+        return {"html_path": html_path, "html_content": html_content}
+    finally:
+        # Clean up the temporary video files
+        for path in (video_path, inputToOutputFilename(video_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@app.post("/upload", status_code=202)
+async def upload_video(video: UploadFile = File(...)):
+    """
+    Endpoint for uploading a video to be converted to a blog post.
 
-        # Clean up the temporary video file
+    Args:
+        video (UploadFile): The uploaded video file.
+
+    Returns:
+        dict: The job ID to poll /jobs/{job_id} with, and the upload's sha256 and size.
+    """
+    # Save the uploaded video to a temporary file, unique per upload. Only a plain
+    # extension of the client's filename makes it into the path, ffmpeg picks the
+    # output format of the shortened copy by it.
+    ext = os.path.splitext(video.filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,8}", ext):
+        ext = ".mp4"
+    video_path = f"temp_{uuid.uuid4().hex}{ext}"
+    upload = await save_upload(video, video_path)
+
+    try:
+        job = job_queue.submit(lambda job: process_upload(video_path, job), info=upload)
+    except QueueFullError as e:
         os.remove(video_path)
+        raise HTTPException(status_code=503, detail=f"Too many videos in the queue, try again later ({e})")
+    return {"job_id": job.id, "status": job.status, **upload}
+
+
+@app.get("/transcription/stats")
+async def transcription_stats():
+    """
+    Reports how long loading and warming up the Whisper model took, inference
+    totals and memory use.
+    """
+    return get_transcription_service().stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Reports how many results are cached and how much of the size budget they use."""
+    return result_cache.stats()
+
 
-        return {"html_content": html_content}
-    except Exception as e:
-        return {"error": str(e)}
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Reports a job's status, the stage it is in and, once done, its result.
+
+    Returns:
+        dict: The job. result holds html_path and html_content when status is "done".
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
 
 
 if __name__ == "__main__":
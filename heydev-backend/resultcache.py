@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def make_key(*parts) -> str:
+    """
+    Hashes anything JSON can represent into a cache key. Chain keys by passing
+    the key of the stage an output was made from, plus this stage's parameters.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed store for pipeline outputs on disk. Every entry is a
+    folder of files under root, named by its key. When the total size goes
+    over max_bytes, the least recently used entries are deleted.
+
+    Entries used in the last min_age seconds are never evicted, so a job that
+    just looked something up can still read it. The cache can briefly exceed
+    its budget because of this.
+    """
+
+    def __init__(self, root: str, max_bytes: int, min_age: float = 600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> bytes, least recently used first
+        self._last_used: Dict[str, float] = {}
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def get_files(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Returns:
+            dict: Name to path of every file stored under key, in the order they
+            were stored, or None if key isn't cached.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._touch(key)
+        entry = self._entry_path(key)
+        with open(os.path.join(entry, "meta.json"), "r") as f:
+            names = json.load(f)["files"]
+        return {name: os.path.join(entry, name) for name in names}
+
+    def put_files(self, key: str, files: Dict[str, str], move: bool = False) -> Dict[str, str]:
+        """
+        Stores files under key. Names may contain folders, e.g. "photos/frame0.jpg".
+
+        Args:
+            files (dict): Name in the entry to the path of the file to store.
+            move (bool): Move the files in instead of copying them.
+
+        Returns:
+            dict: Name to path of the stored copies.
+        """
+        staging = os.path.join(self.root, f"tmp-{uuid.uuid4().hex}")
+        size = 0
+        for name, path in files.items():
+            target = os.path.join(staging, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if move:
+                shutil.move(path, target)
+            else:
+                shutil.copyfile(path, target)
+            size += os.path.getsize(target)
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"files": list(files), "created_at": time.time()}, f)
+
+        with self._lock:
+            entry = self._entry_path(key)
+            if key in self._entries:  # another job stored it first
+                shutil.rmtree(staging, ignore_errors=True)
+            else:
+                os.rename(staging, entry)
+                self._entries[key] = size
+            self._touch(key)
+            self._evict()
+        return {name: os.path.join(entry, name) for name in files}
+
+    def get_text(self, key: str) -> Optional[str]:
+        files = self.get_files(key)
+        if files is None:
+            return None
+        with open(files["value.txt"], "r") as f:
+            return f.read()
+
+    def put_text(self, key: str, text: str):
+        staging = os.path.join(self.root, f"tmp-{uuid.uuid4().hex}.txt")
+        with open(staging, "w") as f:
+            f.write(text)
+        self.put_files(key, {"value.txt": staging}, move=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": sum(self._entries.values()), "max_bytes": self.max_bytes}
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _touch(self, key: str):
+        # The folder's mtime remembers the last use across restarts
+        self._entries.move_to_end(key)
+        self._last_used[key] = time.time()
+        try:
+            os.utime(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = sum(self._entries.values())
+        now = time.time()
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if now - self._last_used.get(key, 0) < self.min_age:
+                continue
+            total -= self._entries.pop(key)
+            self._last_used.pop(key, None)
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+
+    def _load_index(self):
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith("tmp-"):  # left behind by a crash while storing
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+                continue
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(folder, file))
+                for folder, _, files in os.walk(path)
+                for file in files
+                if not (folder == path and file == "meta.json")  # put_files() doesn't count it either
+            )
+            found.append((os.path.getmtime(path), name, size))
+        for last_used, key, size in sorted(found):
+            self._entries[key] = size
+            self._last_used[key] = last_used
@@ -1,22 +1,42 @@
-from contextlib import closing
-from PIL import Image
+from contextlib import contextmanager
+import cProfile
+import copy
+from dataclasses import dataclass, field, replace
+from fractions import Fraction
+import hashlib
+import json
 import subprocess
 from audiotsm import phasevocoder
-from audiotsm.io.wav import WavReader, WavWriter
+from audiotsm.io.array import ArrayReader, FixedArrayWriter
 from scipy.io import wavfile
+from scipy.ndimage import maximum_filter1d
+from scipy.signal import resample_poly
 import numpy as np
-import re
 import math
 import os
 import argparse
-from pytube import YouTube
 import shutil
 import logging
+import tempfile
+import resource
+import glob
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import fcntl
+except ImportError: # Windows, resumable runs just don't get locked there
+    fcntl = None
+
+AUDIO_FADE_ENVELOPE_SIZE = 400 # smooth out transitiion's audio by quickly fading in/out (arbitrary magic number whatever)
+ANALYSIS_BLOCK_SIZE = 1<<20 # samples per block read by the streaming analysis
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+class JumpCutterError(Exception):
+    pass
 
 def downloadFile(url):
     try:
+        from pytube import YouTube # only needed for --url, and slow to import
         yt = YouTube(url)
         name = yt.streams.first().download()
         newname = name.replace(' ','_')
@@ -31,6 +51,168 @@ def getMaxVolume(s):
     minv = float(np.min(s))
     return max(maxv,-minv)
 
+class CountingArrayWriter(FixedArrayWriter):
+    # FixedArrayWriter that remembers how many samples ended up in its buffer.
+    def __init__(self, data):
+        super().__init__(data)
+        self.written = 0
+
+    def write(self, buffer):
+        n = super().write(buffer)
+        self.written += n
+        return n
+
+def stretchAudio(audioChunk,speed,outputBuffer):
+    # Time-stretches a (samples, channels) float array with the phase vocoder,
+    # writing the result into the front of outputBuffer. Returns the sample count.
+    if speed == 1: # nothing to stretch, just copy it over
+        outputBuffer[:audioChunk.shape[0]] = audioChunk
+        return audioChunk.shape[0]
+    reader = ArrayReader(audioChunk.T)
+    writer = CountingArrayWriter(outputBuffer.T)
+    tsm = phasevocoder(audioChunk.shape[1], speed=speed)
+    tsm.run(reader, writer)
+    return writer.written
+
+def stretchChunk(audioChunk,speed):
+    # Same as stretchAudio, but allocates its own buffer so it can run in a worker process.
+    outputBuffer = np.zeros((int(math.ceil(audioChunk.shape[0]/speed)),audioChunk.shape[1]),dtype=np.float32)
+    leng = stretchAudio(audioChunk,speed,outputBuffer)
+    return outputBuffer[:leng]
+
+def parallelMap(function,jobs,workers):
+    # Runs function(*job) for every job in a process pool and yields the futures
+    # in submission order. Only a few jobs per worker are queued at a time, so the
+    # inputs are not all held in memory at once.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for job in jobs:
+            pending.append(executor.submit(function,*job))
+            if len(pending) >= workers*4:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+def getPeaksAt(audioData,starts):
+    # Loudest sample (positive or negative) between each pair of consecutive
+    # offsets in starts, the last one running to the end of audioData.
+    highs = audioData.max(axis=1) if audioData.ndim > 1 else audioData
+    lows = audioData.min(axis=1) if audioData.ndim > 1 else audioData
+    maxv = np.maximum.reduceat(highs,starts).astype(np.float64)
+    minv = np.minimum.reduceat(lows,starts).astype(np.float64)
+    return np.maximum(maxv,-minv)
+
+def getFramePeaks(audioData,samplesPerFrame):
+    # Peak of every video frame's slice of audio, computed for all frames at
+    # once instead of calling getMaxVolume per frame.
+    audioFrameCount = int(math.ceil(audioData.shape[0]/samplesPerFrame))
+    return getPeaksAt(audioData,(np.arange(audioFrameCount)*samplesPerFrame).astype(np.int64))
+
+def iterFramePeaks(blocks,samplesPerFrame):
+    # Streaming version of getFramePeaks. Takes an iterable of (samples, channels)
+    # blocks and yields the peaks of every frame as soon as its audio is complete,
+    # so only about one block is ever held in memory.
+    buffer = None
+    bufferStart = 0 # sample index of buffer[0], always the start of frame `frame`
+    frame = 0
+    for block in blocks:
+        buffer = block if buffer is None else np.concatenate((buffer,block))
+        bufferEnd = bufferStart+buffer.shape[0]
+        candidates = int(bufferEnd/samplesPerFrame)-frame+1
+        if candidates <= 0:
+            continue
+        bounds = (np.arange(frame,frame+candidates+1)*samplesPerFrame).astype(np.int64)
+        complete = int(np.count_nonzero(bounds[1:] <= bufferEnd))
+        if complete == 0:
+            continue
+        local = bounds[:complete+1]-bufferStart
+        yield getPeaksAt(buffer[:local[-1]],local[:-1])
+        buffer = buffer[local[-1]:]
+        bufferStart = int(bounds[complete])
+        frame += complete
+    if buffer is not None and buffer.shape[0] > 0: # the last frame may be cut short
+        remaining = int(math.ceil((bufferStart+buffer.shape[0])/samplesPerFrame))-frame
+        yield getPeaksAt(buffer,(np.arange(frame,frame+remaining)*samplesPerFrame).astype(np.int64)-bufferStart)
+
+def wavBlocks(wavPath,blockSize):
+    # Reads a WAV file through a memory map, blockSize samples at a time.
+    _, audioData = wavfile.read(wavPath,mmap=True)
+    for start in range(0,audioData.shape[0],blockSize):
+        yield np.array(audioData[start:start+blockSize])
+
+def pipeBlocks(inputFile,sampleRate,channels,blockSize):
+    # Decodes the audio of inputFile to 16-bit PCM through an ffmpeg pipe and
+    # yields it blockSize samples at a time, without writing a WAV file.
+    frameBytes = 2*channels
+    decoder = subprocess.Popen(["ffmpeg","-i",inputFile,"-vn","-ac",str(channels),"-ar",str(int(sampleRate)),"-f","s16le","-hide_banner","-loglevel","error","-"],
+        stdout=subprocess.PIPE)
+    try:
+        while True:
+            data = decoder.stdout.read(blockSize*frameBytes)
+            usable = len(data)-len(data)%frameBytes
+            if usable > 0:
+                yield np.frombuffer(data[:usable],dtype=np.int16).reshape(-1,channels)
+            if len(data) < blockSize*frameBytes:
+                break
+    finally:
+        decoder.stdout.close()
+        decoder.wait()
+
+def spreadFrames(hasLoudAudio,frameSpreadage):
+    # Marks every frame within frameSpreadage of a loud one, along the last axis.
+    before = int(math.ceil(frameSpreadage))
+    after = int(math.floor(frameSpreadage))
+    return maximum_filter1d(hasLoudAudio,before+after+1,axis=-1,mode='constant',cval=0)
+
+def sweep(framePeaks,frameRate,referenceVolume,thresholds,margins,soundedSpeeds,silentSpeeds,dropSilence=False):
+    # Predicts the result of every threshold x margin x speed combination from
+    # the frame peaks alone. All thresholds are evaluated at once per margin, and
+    # the speeds only scale the frame counts. Returns one dict per combination.
+    thresholds = np.asarray(thresholds,dtype=np.float64)
+    hasLoudAudio = (framePeaks[np.newaxis,:]/referenceVolume >= thresholds[:,np.newaxis]).astype(np.int8)
+    results = []
+    for margin in margins:
+        shouldIncludeFrame = spreadFrames(hasLoudAudio,margin)
+        soundedFrames = np.count_nonzero(shouldIncludeFrame,axis=1)
+        silentFrames = len(framePeaks)-soundedFrames
+        flips = np.count_nonzero(np.diff(shouldIncludeFrame,axis=1),axis=1)
+        soundedChunks = (flips+shouldIncludeFrame[:,0]+shouldIncludeFrame[:,-1])//2 # every sounded run has a start and an end
+        for soundedSpeed in soundedSpeeds:
+            for silentSpeed in silentSpeeds:
+                dropping = dropSilence or silentSpeed >= 999999
+                outputFrames = soundedFrames/soundedSpeed+(0 if dropping else silentFrames/silentSpeed)
+                for i, threshold in enumerate(thresholds):
+                    results.append({
+                        "silentThreshold": float(threshold),
+                        "frameMargin": margin,
+                        "soundedSpeed": soundedSpeed,
+                        "silentSpeed": silentSpeed,
+                        "outputDuration": float(outputFrames[i]/frameRate),
+                        "cuts": int(max(soundedChunks[i]-1,0) if dropping else flips[i]),
+                        "soundedFraction": float(soundedFrames[i]/len(framePeaks)),
+                    })
+    return results
+
+def pickSettings(results,targetDuration):
+    # The sweep result that comes closest to targetDuration without going over
+    # it, or the shortest one if they are all too long.
+    fitting = [r for r in results if r["outputDuration"] <= targetDuration]
+    if not fitting:
+        return min(results, key=lambda r: r["outputDuration"])
+    return max(fitting, key=lambda r: (r["outputDuration"], -r["cuts"]))
+
+def getChunks(framePeaks,maxAudioVolume,silentThreshold,frameSpreadage):
+    # Returns an (n,3) int array of [startFrame, endFrame, sounded] rows covering
+    # every frame. A frame counts as sounded if any frame within frameSpreadage
+    # of it is loud, i.e. the window [i-ceil(margin), i+floor(margin)].
+    audioFrameCount = len(framePeaks)
+    hasLoudAudio = (framePeaks/maxAudioVolume >= silentThreshold).astype(np.int8)
+    shouldIncludeFrame = spreadFrames(hasLoudAudio,frameSpreadage)
+    flips = np.flatnonzero(np.diff(shouldIncludeFrame))+1 # Did we flip?
+    starts = np.concatenate(([0],flips))
+    ends = np.concatenate((flips,[audioFrameCount]))
+    return np.stack((starts,ends,shouldIncludeFrame[starts]),axis=1).astype(np.int64)
+
 def copyFrame(inputFrame,outputFrame,TEMP_FOLDER):
     src = os.path.join(TEMP_FOLDER,"frame{:06d}.jpg".format(inputFrame+1))
     dst = os.path.join(TEMP_FOLDER,"newFrame{:06d}.jpg".format(outputFrame+1))
@@ -38,13 +220,300 @@ def copyFrame(inputFrame,outputFrame,TEMP_FOLDER):
         return False
     shutil.copyfile(src, dst)
     if outputFrame%20 == 19:
-        logging.info(f"{outputFrame+1} time-altered frames saved.")
+        logging.debug(f"{outputFrame+1} time-altered frames saved.")
     return True
 
+def renderPiped(inputFile,outputFile,frameMap,frameSize,frameRate,audioFile,preset=None):
+    # Streams raw frames from a decoding ffmpeg into an encoding ffmpeg, only
+    # ever holding a single frame in memory. frameMap[i] is the input frame
+    # index to show as output frame i and must never decrease. frameSize is the
+    # size of the decoded frames, i.e. after ffmpeg has applied any rotation.
+    width, height = frameSize
+    frameBytes = width*height*3
+    decoder = subprocess.Popen(["ffmpeg","-i",inputFile,"-an","-f","rawvideo","-pix_fmt","rgb24","-hide_banner","-loglevel","error","-"],
+        stdout=subprocess.PIPE)
+    encoder = subprocess.Popen(["ffmpeg","-y","-f","rawvideo","-pix_fmt","rgb24","-s",f"{width}x{height}","-framerate",str(frameRate),"-i","-",
+        "-i",audioFile,"-pix_fmt","yuv420p",*(["-preset",preset] if preset else []),"-strict","-2","-hide_banner",outputFile],
+        stdin=subprocess.PIPE)
+    try:
+        frame = None
+        currentFrame = -1
+        for outputFrame, inputFrame in enumerate(frameMap):
+            while currentFrame < inputFrame:
+                data = decoder.stdout.read(frameBytes)
+                if len(data) < frameBytes: # decoder ran dry, keep repeating the last frame we got
+                    break
+                frame = data
+                currentFrame += 1
+            if frame is None:
+                raise RuntimeError(f"could not decode any frames from {inputFile}")
+            encoder.stdin.write(frame)
+            if outputFrame%20 == 19:
+                logging.debug(f"{outputFrame+1} time-altered frames piped.")
+    finally:
+        decoder.stdout.close()
+        encoder.stdin.close()
+        decoder.wait()
+        encoder.wait()
+    if encoder.returncode != 0:
+        raise RuntimeError(f"ffmpeg encoder exited with code {encoder.returncode}")
+
+def atempoChain(speed):
+    # atempo only accepts factors between 0.5 and 2.0 on older ffmpeg builds,
+    # so bigger changes are done as a chain of filters.
+    if speed == 1:
+        return "anull"
+    filters = []
+    while speed > 2.0:
+        filters.append("atempo=2.0")
+        speed /= 2.0
+    while speed < 0.5:
+        filters.append("atempo=0.5")
+        speed /= 0.5
+    filters.append(f"atempo={speed}")
+    return ",".join(filters)
+
+def buildFilterGraph(chunks,speeds,frameRate,sampleRate,fadeSize,outputFrameRate=None,outputHeight=None,audioCopy=False):
+    # Turns the chunk list into a filter_complex script: every chunk is trimmed
+    # out of the input, sped up with setpts/atempo and everything is concatenated.
+    # outputFrameRate and outputHeight shrink the result, e.g. for previews. The
+    # video is shrunk once right after decoding and split between the chunks, so
+    # no trim or concat ever handles a full-size frame.
+    # audioCopy adds a second [copya] output with the same audio as [outa].
+    kept = []
+    for chunk in chunks:
+        startFrame, endFrame, speed = int(chunk[0]), int(chunk[1]), speeds[int(chunk[2])]
+        duration = (endFrame-startFrame)/frameRate/speed
+        if duration >= 1/frameRate: # shorter would not even last a single output frame, drop it
+            kept.append((startFrame,endFrame,speed,duration))
+
+    filters = []
+    videoInputs = ["[0:v]"]*len(kept)
+    inputFilters = []
+    if outputFrameRate and outputFrameRate < frameRate:
+        inputFilters.append(f"fps={outputFrameRate}")
+    if outputHeight:
+        inputFilters.append(f"scale=-2:'min({int(outputHeight)},ih)'") # never upscale
+    if inputFilters and kept:
+        videoInputs = [f"[s{i}]" for i in range(len(kept))]
+        filters.append(f"[0:v]{','.join(inputFilters)},split={len(kept)}{''.join(videoInputs)}")
+
+    labels = []
+    fadeLength = fadeSize/sampleRate
+    for i, (startFrame, endFrame, speed, duration) in enumerate(kept):
+        start, end = startFrame/frameRate, endFrame/frameRate
+        filters.append(f"{videoInputs[i]}trim=start={start}:end={end},setpts=(PTS-STARTPTS)/{speed}[v{i}]")
+        audio = f"[0:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS,{atempoChain(speed)}"
+        if duration > 2*fadeLength:
+            audio += f",afade=t=in:d={fadeLength},afade=t=out:st={duration-fadeLength}:d={fadeLength}"
+        filters.append(audio+f"[a{i}]")
+        labels.append(f"[v{i}][a{i}]")
+    filters.append(f"{''.join(labels)}concat=n={len(labels)}:v=1:a=1[catv]{'[cata]' if audioCopy else '[outa]'}")
+    if audioCopy:
+        filters.append("[cata]asplit=2[outa][copya]")
+    # sped up chunks run at a multiple of the frame rate until here
+    filters.append(f"[catv]fps={min(outputFrameRate,frameRate) if outputFrameRate else frameRate}[outv]")
+    return ";\n".join(filters)
+
+def resampleMono(audioData,sampleRate,targetRate):
+    # Mixes a (samples, channels) track down to mono float32 and resamples it,
+    # e.g. to the 16 kHz Whisper expects.
+    mono = audioData.mean(axis=1,dtype=np.float32) if audioData.ndim > 1 else audioData.astype(np.float32)
+    divisor = math.gcd(int(sampleRate),int(targetRate))
+    return resample_poly(mono,int(targetRate)//divisor,int(sampleRate)//divisor).astype(np.float32)
+
+def outputPauses(chunks,speeds,frameRate):
+    # Seconds into the output where speech stops for a moment: the middle of
+    # every silent chunk, and every cut between sounded chunks whose silence was
+    # dropped. Chunk lengths are the nominal length/speed, so on long videos
+    # these can be a few frames off the rendered track.
+    if len(chunks) == 0:
+        return np.zeros(0)
+    lengths = (chunks[:,1]-chunks[:,0])/np.asarray(speeds,dtype=np.float64)[chunks[:,2]]
+    starts = np.concatenate(([0.0],np.cumsum(lengths)[:-1]))
+    silent = chunks[:,2] == 0
+    middles = (starts+lengths/2)[silent]
+    cuts = starts[1:][~silent[1:] & ~silent[:-1]]
+    return np.sort(np.concatenate((middles,cuts)))/frameRate
+
+def pickSegmentSplits(chunkOutputFrames,frameCount,segments):
+    # Picks up to segments-1 output frames to split the encode at. Splits only
+    # ever fall where a chunk starts, as close to even lengths as the chunks allow.
+    candidates = np.unique(np.asarray(chunkOutputFrames,dtype=np.int64))
+    candidates = candidates[(candidates > 0) & (candidates < frameCount)]
+    if segments <= 1 or len(candidates) == 0:
+        return []
+    targets = np.arange(1,segments)*frameCount/segments
+    picks = candidates[np.abs(candidates[np.newaxis,:]-targets[:,np.newaxis]).argmin(axis=1)]
+    return np.unique(picks).tolist()
+
+def encodeSegments(tempFolder,frameCount,frameRate,splits,audioFile,outputFile,preset=None):
+    # Encodes newFrame%06d.jpg as one video-only segment per [split, next split)
+    # range, all at the same time, then joins them with the concat demuxer and
+    # muxes the audio in. Nothing is re-encoded after the segments are done.
+    presetArgs = ["-preset",preset] if preset else []
+    bounds = [0]+list(splits)+[frameCount]
+    segmentFiles = []
+    processes = []
+    try:
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            segmentFile = os.path.join(tempFolder,f"segment{i:04d}.mp4")
+            segmentFiles.append(segmentFile)
+            processes.append(subprocess.Popen(["ffmpeg","-y","-framerate",str(frameRate),"-start_number",str(start+1),
+                "-i",os.path.join(tempFolder,"newFrame%06d.jpg"),"-frames:v",str(end-start),"-an","-c:v","libx264",*presetArgs,
+                "-hide_banner","-loglevel","error",segmentFile]))
+    finally:
+        returnCodes = [process.wait() for process in processes]
+    if any(returnCodes):
+        raise RuntimeError(f"ffmpeg exited with codes {returnCodes} while encoding segments")
+
+    listFile = os.path.join(tempFolder,"segments.txt")
+    with open(listFile, "w") as f:
+        for segmentFile in segmentFiles:
+            f.write(f"file '{os.path.abspath(segmentFile)}'\n")
+    subprocess.run(["ffmpeg","-y","-f","concat","-safe","0","-i",listFile,"-i",audioFile,"-map","0:v","-map","1:a",
+        "-c:v","copy","-strict","-2","-hide_banner",outputFile], check=True)
+
+PROBE_CACHE_FOLDER = os.environ.get("JUMPCUTTER_PROBE_CACHE", os.path.join(os.path.expanduser("~"),".cache","jumpcutter","probe"))
+
+@dataclass
+class MediaInfo:
+    # What ffprobe knows about a media file. Anything a file doesn't have is None.
+    path: str
+    duration: float # seconds
+    formatName: str
+    videoCodec: str = None
+    width: int = None
+    height: int = None
+    frameRate: Fraction = None # exact, e.g. 30000/1001 rather than 29.97
+    frameCount: int = None # as stored in the container, or estimated from duration and frame rate
+    videoDuration: float = None # seconds of video, audio padding often makes duration a little longer
+    audioCodec: str = None
+    audioSampleRate: int = None
+    audioChannels: int = None
+    rotation: int = 0 # degrees clockwise the player turns the video by, 0, 90, 180 or 270
+
+    def displaySize(self):
+        # (width, height) of the frames ffmpeg decodes, which it turns upright by default
+        if self.width is None:
+            return None
+        return (self.height,self.width) if self.rotation in (90,270) else (self.width,self.height)
+
+def parseRate(rate):
+    # ffprobe writes rates as "num/den" and "0/0" when it doesn't know.
+    try:
+        rate = Fraction(rate)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+def parseRotation(stream):
+    # Older ffmpeg writes the rotation as a "rotate" tag, newer ones as a
+    # display matrix in the side data, counter-clockwise and often negative.
+    try:
+        if "rotate" in stream.get("tags",{}):
+            return int(float(stream["tags"]["rotate"]))%360
+        for sideData in stream.get("side_data_list",[]):
+            if "rotation" in sideData:
+                return int(-float(sideData["rotation"]))%360
+    except (TypeError, ValueError):
+        pass
+    return 0
+
+def parseProbe(path,probe):
+    # Turns ffprobe's -show_format -show_streams JSON into a MediaInfo.
+    fmt = probe.get("format",{})
+    video = next((st for st in probe.get("streams",[]) if st.get("codec_type") == "video" and not st.get("disposition",{}).get("attached_pic")),None)
+    audio = next((st for st in probe.get("streams",[]) if st.get("codec_type") == "audio"),None)
+    duration = float(fmt["duration"]) if "duration" in fmt else None
+    info = MediaInfo(path, duration, fmt.get("format_name"))
+    if video is not None:
+        info.videoCodec = video.get("codec_name")
+        info.width = video.get("width")
+        info.height = video.get("height")
+        info.rotation = parseRotation(video)
+        info.frameRate = parseRate(video.get("avg_frame_rate")) or parseRate(video.get("r_frame_rate"))
+        info.videoDuration = float(video["duration"]) if video.get("duration") else None
+        if video.get("nb_frames"):
+            info.frameCount = int(video["nb_frames"])
+        elif (info.videoDuration or duration) is not None and info.frameRate is not None:
+            info.frameCount = int(round((info.videoDuration or duration)*info.frameRate))
+    if audio is not None:
+        info.audioCodec = audio.get("codec_name")
+        info.audioSampleRate = int(audio["sample_rate"]) if audio.get("sample_rate") else None
+        info.audioChannels = audio.get("channels")
+    return info
+
+def getFileKey(path,blockSize=1<<20):
+    # Cheap identity of a file's contents: size, mtime and a hash of its first
+    # and last blockSize bytes. Good enough to tell uploads apart without reading
+    # multi-gigabyte files in full.
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}:".encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(blockSize))
+        if stat.st_size > blockSize:
+            f.seek(max(blockSize,stat.st_size-blockSize))
+            digest.update(f.read(blockSize))
+    return digest.hexdigest()
+
+def probeMedia(path,cacheFolder=None):
+    """
+    Reads stream information with ffprobe. Results are cached on disk by
+    getFileKey(), so every stage working on the same file shares one probe.
+
+    Args:
+        path (str): Path to the media file.
+        cacheFolder (str): Where to keep cached probes. Defaults to PROBE_CACHE_FOLDER, which
+            is $JUMPCUTTER_PROBE_CACHE or ~/.cache/jumpcutter/probe.
+
+    Returns:
+        MediaInfo: The parsed stream information.
+    """
+    cacheFolder = cacheFolder if cacheFolder else PROBE_CACHE_FOLDER
+    try:
+        cacheFile = os.path.join(cacheFolder,getFileKey(path)+".json")
+    except OSError as e:
+        raise JumpCutterError(f"Could not read {path}: {e}") from e
+    try:
+        with open(cacheFile, "r") as f:
+            return parseProbe(path,json.load(f))
+    except (OSError, ValueError):
+        pass
+
+    command = ["ffprobe","-v","error","-print_format","json","-show_format","-show_streams",path]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        raise JumpCutterError(f"Error probing {path} with ffprobe: {e}") from e
+
+    if createPath(cacheFolder):
+        try:
+            # write then rename, so a concurrent reader never sees half a file
+            partialFile = f"{cacheFile}.{os.getpid()}.tmp"
+            with open(partialFile, "w") as f:
+                json.dump(probe, f)
+            os.replace(partialFile, cacheFile)
+        except OSError as e:
+            logging.warning(f"Could not cache probe of {path}: {e}")
+    return parseProbe(path,probe)
+
 def inputToOutputFilename(filename):
     dotIndex = filename.rfind(".")
     return filename[:dotIndex]+"_ALTERED"+filename[dotIndex:]
 
+def createTempFolder(scratchFolder=None):
+    # Every run gets its own folder, so several jumpcuts can share a machine
+    # without overwriting each other's frames and audio.
+    if scratchFolder is not None and not createPath(scratchFolder):
+        return None
+    try:
+        return tempfile.mkdtemp(prefix="jumpcutter-",dir=scratchFolder)
+    except OSError as e:
+        logging.error(f"Creation of a temporary directory in {scratchFolder} failed: {e}")
+        return None
+
 def createPath(s):
     try:
         os.makedirs(s, exist_ok=True)
@@ -60,184 +529,751 @@ def deletePath(s): # Dangerous! Watch out!
     except OSError as e:
         logging.error(f"Deletion of the directory {s} failed: {e}")
 
-parser = argparse.ArgumentParser(description='Modifies a video file to play at different speeds when there is sound vs. silence.')
-parser.add_argument('--input_file', type=str,  help='the video file you want modified', default="original-video.mp4")
-parser.add_argument('--url', type=str, help='A youtube url to download and process')
-parser.add_argument('--output_file', type=str, default="shortened_video.mp4", help="the output file. (optional. if not included, it'll just modify the input file name)")
-parser.add_argument('--silent_threshold', type=float, default=0.03, help="the volume amount that frames' audio needs to surpass to be consider \"sounded\". It ranges from 0 (silence) to 1 (max volume)")
-parser.add_argument('--sounded_speed', type=float, default=1.00, help="the speed that sounded (spoken) frames should be played at. Typically 1.")
-parser.add_argument('--silent_speed', type=float, default=5.00, help="the speed that silent frames should be played at. 999999 for jumpcutting.")
-parser.add_argument('--frame_margin', type=float, default=1, help="some silent frames adjacent to sounded frames are included to provide context. How many frames on either the side of speech should be included? That's this variable.")
-parser.add_argument('--sample_rate', type=float, default=44100, help="sample rate of the input and output videos")
-parser.add_argument('--frame_rate', type=float, default=30, help="frame rate of the input and output videos. optional... I try to find it out myself, but it doesn't always work.")
-parser.add_argument('--frame_quality', type=int, default=3, help="quality of frames to be extracted from input video. 1 is highest, 31 is lowest, 3 is the default.")
-
-args = parser.parse_args()
-
-frameRate = args.frame_rate
-SAMPLE_RATE = args.sample_rate
-SILENT_THRESHOLD = args.silent_threshold
-FRAME_SPREADAGE = args.frame_margin
-NEW_SPEED = [args.silent_speed, args.sounded_speed]
-INPUT_FILE = args.input_file
-URL = args.url
-FRAME_QUALITY = args.frame_quality
-
-if URL is not None:
-    INPUT_FILE = downloadFile(URL)
-    if INPUT_FILE is None:
-        logging.error("Failed to download video from URL. Aborting.")
-        exit()
-elif not os.path.exists(INPUT_FILE):
-    logging.error(f"Input file '{INPUT_FILE}' not found. Aborting.")
-    exit()
-    
-OUTPUT_FILE = args.output_file if args.output_file else inputToOutputFilename(INPUT_FILE)
-
-TEMP_FOLDER = "TEMP"
-AUDIO_FADE_ENVELOPE_SIZE = 400 # smooth out transitiion's audio by quickly fading in/out (arbitrary magic number whatever)
+def hashFile(path,blockSize=1<<20):
+    # sha256 of the whole file, read blockSize bytes at a time. Unlike getFileKey()
+    # this matches for copies of the same file, e.g. repeated uploads.
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-if not createPath(TEMP_FOLDER):
-    logging.error(f"Could not create temporary directory '{TEMP_FOLDER}'. Aborting.")
-    exit()
+@contextmanager
+def lockFolder(folder):
+    # Keeps two resumed runs of the same input from working in one folder at once.
+    with open(os.path.join(folder,".lock"), "w") as lockFile:
+        if fcntl is not None:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
 
-# Extract frames from video
-logging.info(f"Extracting frames from {INPUT_FILE}...")
-command = f"ffmpeg -i {INPUT_FILE} -qscale:v {FRAME_QUALITY} {os.path.join(TEMP_FOLDER,'frame%06d.jpg')} -hide_banner"
-try:
-    subprocess.call(command, shell=True)
-except Exception as e:
-    logging.error(f"Error extracting frames: {e}")
-    deletePath(TEMP_FOLDER)
-    exit()
-
-# Extract audio from video
-logging.info(f"Extracting audio from {INPUT_FILE}...")
-command = f"ffmpeg -i {INPUT_FILE} -ab 160k -ac 2 -ar {SAMPLE_RATE} -vn {os.path.join(TEMP_FOLDER,'audio.wav')}"
-try:
-    subprocess.call(command, shell=True)
-except Exception as e:
-    logging.error(f"Error extracting audio: {e}")
-    deletePath(TEMP_FOLDER)
-    exit()
-
-# Get video parameters
-logging.info(f"Getting video parameters from {INPUT_FILE}...")
-command = f"ffmpeg -i {INPUT_FILE} 2>&1"
-params_file = os.path.join(TEMP_FOLDER, "params.txt")
-try:
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
-    with open(params_file, "w") as f:
-        f.write(result.stderr)
-except Exception as e:
-    logging.error(f"Error getting video parameters: {e}")
-    deletePath(TEMP_FOLDER)
-    exit()
+class Manifest:
+    # Which stages of a resumable work folder are complete, and for which
+    # settings. A stage is only marked done after all its files are written, so
+    # anything a crashed run left behind is redone.
+    # Every change re-reads the file first, so several instances on one folder
+    # don't undo each other's marks.
+    def __init__(self, folder):
+        self.path = os.path.join(folder,"manifest.json")
+        self.load()
 
-try:
-    sampleRate, audioData = wavfile.read(os.path.join(TEMP_FOLDER,"audio.wav"))
-    audioSampleCount = audioData.shape[0]
-    maxAudioVolume = getMaxVolume(audioData)
-except Exception as e:
-    logging.error(f"Error reading audio data: {e}")
-    deletePath(TEMP_FOLDER)
-    exit()
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                self.stages = json.load(f)["stages"]
+        except (OSError, ValueError, KeyError):
+            self.stages = {}
 
-try:
-    with open(params_file, 'r') as f:
-        pre_params = f.read()
-    params = pre_params.split('\n')
-    for line in params:
-        m = re.search('Stream #.*Video.* ([0-9]*) fps',line)
-        if m is not None:
-            frameRate = float(m.group(1))
-            break
-except Exception as e:
-    logging.error(f"Error reading frame rate from parameters file: {e}")
-    deletePath(TEMP_FOLDER)
-    exit()
-
-samplesPerFrame = sampleRate/frameRate
-audioFrameCount = int(math.ceil(audioSampleCount/samplesPerFrame))
-hasLoudAudio = np.zeros((audioFrameCount))
-
-for i in range(audioFrameCount):
-    start = int(i*samplesPerFrame)
-    end = min(int((i+1)*samplesPerFrame),audioSampleCount)
-    audiochunks = audioData[start:end]
-    maxchunksVolume = float(getMaxVolume(audiochunks))/maxAudioVolume
-    if maxchunksVolume >= SILENT_THRESHOLD:
-        hasLoudAudio[i] = 1
-
-chunks = [[0,0,0]]
-shouldIncludeFrame = np.zeros((audioFrameCount))
-for i in range(audioFrameCount):
-    start = int(max(0,i-FRAME_SPREADAGE))
-    end = int(min(audioFrameCount,i+1+FRAME_SPREADAGE))
-    shouldIncludeFrame[i] = np.max(hasLoudAudio[start:end])
-    if (i >= 1 and shouldIncludeFrame[i] != shouldIncludeFrame[i-1]): # Did we flip?
-        chunks.append([chunks[-1][1],i,shouldIncludeFrame[i-1]])
-
-chunks.append([chunks[-1][1],audioFrameCount,shouldIncludeFrame[i-1]])
-chunks = chunks[1:]
-
-outputAudioData = np.zeros((0,audioData.shape[1]))
-outputPointer = 0
-
-lastExistingFrame = None
-for chunk in chunks:
-    audioChunk = audioData[int(chunk[0]*samplesPerFrame):int(chunk[1]*samplesPerFrame)]
-    
-    sFile = os.path.join(TEMP_FOLDER,"tempStart.wav")
-    eFile = os.path.join(TEMP_FOLDER,"tempEnd.wav")
-    wavfile.write(sFile,SAMPLE_RATE,audioChunk)
-    with WavReader(sFile) as reader:
-        with WavWriter(eFile, reader.channels, reader.samplerate) as writer:
-            tsm = phasevocoder(reader.channels, speed=NEW_SPEED[int(chunk[2])])
-            tsm.run(reader, writer)
+    def isDone(self, stage, key=None):
+        self.load()
+        return stage in self.stages and self.stages[stage]["key"] == key
+
+    def begin(self, stage):
+        self.load()
+        if self.stages.pop(stage, None) is not None:
+            self.save()
+
+    def markDone(self, stage, key=None):
+        self.load()
+        self.stages[stage] = {"key": key, "finishedAt": time.time()}
+        self.save()
+
+    def save(self):
+        partialPath = f"{self.path}.{os.getpid()}.tmp"
+        with open(partialPath, "w") as f:
+            json.dump({"version": 1, "stages": self.stages}, f, indent=2)
+        os.replace(partialPath, self.path)
+
+@dataclass
+class Analysis:
+    # Everything analyze() learnt about an input, handed on to planChunks() and render().
+    inputFile: str
+    tempFolder: str
+    frameRate: float
+    sampleRate: int
+    frameSize: tuple
+    framePeaks: np.ndarray # peak sample value of every frame, see getFramePeaks
+    maxAudioVolume: float
+    audioData: np.ndarray = None # None when the audio was analysed through a pipe
+
+@dataclass
+class JumpCutResult:
+    outputFile: str
+    chunks: np.ndarray # [startFrame, endFrame, sounded] rows that were rendered
+    frameRate: float
+    sampleRate: int
+    timings: dict = field(default_factory=dict) # seconds spent in every stage
+    profile: dict = None # StageProfile.report() when profiling was turned on
+    audio: np.ndarray = None # the new audio track as mono float32 at returnAudioRate, if that was set
+    pauses: np.ndarray = None # seconds into the output where speech pauses, see outputPauses
+
+EDL_VERSION = 1
+
+def saveEdl(edlFile,analysis,chunks,jumpCutter):
+    # Everything needed to plan and render again without decoding for analysis.
+    # .npz keeps the arrays binary, anything else is written as JSON.
+    edl = {
+        "version": EDL_VERSION,
+        "inputFile": analysis.inputFile,
+        "frameRate": analysis.frameRate,
+        "sampleRate": analysis.sampleRate,
+        "frameSize": analysis.frameSize,
+        "maxAudioVolume": analysis.maxAudioVolume,
+        "settings": {"silentThreshold": jumpCutter.silentThreshold, "frameMargin": jumpCutter.frameMargin, "newSpeed": jumpCutter.newSpeed,
+                     "dropSilence": jumpCutter.dropSilence, "referenceLevel": jumpCutter.referenceLevel},
+    }
+    if edlFile.endswith(".npz"):
+        np.savez_compressed(edlFile, metadata=json.dumps(edl), framePeaks=analysis.framePeaks.astype(np.int32), chunks=chunks)
+    else:
+        edl["framePeaks"] = analysis.framePeaks.astype(np.int64).tolist() # peaks of 16-bit samples, always whole numbers
+        edl["chunks"] = chunks.tolist()
+        with open(edlFile, "w") as f:
+            json.dump(edl, f)
+
+def loadEdl(edlFile):
+    # Returns the Analysis stored by saveEdl, without audio data or a temp folder.
+    if edlFile.endswith(".npz"):
+        with np.load(edlFile) as data:
+            edl = json.loads(str(data["metadata"]))
+            framePeaks = data["framePeaks"].astype(np.float64)
+    else:
+        with open(edlFile, "r") as f:
+            edl = json.load(f)
+        framePeaks = np.array(edl["framePeaks"],dtype=np.float64)
+    if edl.get("version") != EDL_VERSION:
+        raise ValueError(f"unsupported EDL version {edl.get('version')}")
+    frameSize = tuple(edl["frameSize"]) if edl["frameSize"] is not None else None
+    return Analysis(edl["inputFile"], None, edl["frameRate"], edl["sampleRate"], frameSize, framePeaks, edl["maxAudioVolume"])
+
+def readIoCounters():
+    # Bytes this process and its exited children have read and written through
+    # system calls, cache hits included. Linux only, elsewhere both stay 0.
+    counters = {"rchar": 0, "wchar": 0}
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in counters:
+                    counters[key] = int(value)
+    except OSError:
+        pass
+    return counters["rchar"], counters["wchar"]
+
+class StageProfile(dict):
+    # Drop-in for the timings dict that also records CPU time, I/O and peak
+    # memory for every stage. ffmpeg and worker processes count once they have exited. If cProfileFile is set, the Python
+    # loops (analysis, time-stretching and frame mapping) also run under cProfile.
+    PROFILED_STAGES = ("analyze","stretch","frame_mapping")
+
+    def __init__(self, cProfileFile=None):
+        super().__init__()
+        self.stages = {}
+        self.cProfileFile = cProfileFile
+        self.profiler = cProfile.Profile() if cProfileFile else None
+
+    @contextmanager
+    def measure(self, stage):
+        startTimes = os.times()
+        startSelf = resource.getrusage(resource.RUSAGE_SELF)
+        startRead, startWritten = readIoCounters()
+        profiling = self.profiler is not None and stage in self.PROFILED_STAGES
+        if profiling:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter()-start
+            if profiling:
+                self.profiler.disable()
+            endTimes = os.times()
+            endSelf = resource.getrusage(resource.RUSAGE_SELF)
+            endChildren = resource.getrusage(resource.RUSAGE_CHILDREN)
+            endRead, endWritten = readIoCounters()
+            self[stage] = self.get(stage,0)+wall
+            stats = self.stages.setdefault(stage, {"wall": 0.0, "cpu": 0.0, "childCpu": 0.0, "readBytes": 0, "writtenBytes": 0})
+            stats["wall"] += wall
+            stats["cpu"] += (endTimes.user-startTimes.user)+(endTimes.system-startTimes.system)
+            stats["childCpu"] += (endTimes.children_user-startTimes.children_user)+(endTimes.children_system-startTimes.children_system)
+            stats["readBytes"] += endRead-startRead
+            stats["writtenBytes"] += endWritten-startWritten
+            # Peaks never go down, so this is the high-water mark at the end of the stage.
+            stats["peakRssKb"] = endSelf.ru_maxrss
+            stats["peakChildRssKb"] = endChildren.ru_maxrss
+            stats["rssGrowthKb"] = stats.get("rssGrowthKb",0)+endSelf.ru_maxrss-startSelf.ru_maxrss
+
+    def report(self):
+        # Everything recorded so far as a JSON-friendly dict. Writes the cProfile
+        # stats too, if they were asked for.
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.cProfileFile)
+        total = {key: sum(stats[key] for stats in self.stages.values()) for key in
+                 ("wall","cpu","childCpu","readBytes","writtenBytes")}
+        total["peakRssKb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        total["peakChildRssKb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return {"stages": self.stages, "total": total, "cProfileFile": self.cProfileFile}
+
+@contextmanager
+def timed(timings,stage):
+    if isinstance(timings,StageProfile):
+        with timings.measure(stage):
+            yield
+        return
+    start = time.perf_counter()
     try:
-        _, alteredAudioData = wavfile.read(eFile)
-        leng = alteredAudioData.shape[0]
-        endPointer = outputPointer+leng
-        outputAudioData = np.concatenate((outputAudioData,alteredAudioData/maxAudioVolume))
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage,0)+time.perf_counter()-start
+
+class JumpCutter:
+    """
+    Modifies a video file to play at different speeds when there is sound vs. silence.
+
+    The settings match the command line flags. run() does the whole job, or
+    analyze(), planChunks() and render() can be called one after another to
+    look at or tweak the chunk list in between. Instances hold no per-run
+    state, so one can be reused for many inputs.
+    """
+
+    def __init__(self, silentThreshold=0.03, soundedSpeed=1.0, silentSpeed=5.0, frameMargin=1, sampleRate=None, frameRate=30,
+                 frameQuality=3, renderer="jpeg", workers=1, dropSilence=False, streamingAnalysis=False, referenceLevel=None, scratchFolder=None,
+                 encodeSegments=1, preset=None, profile=False, cProfileFile=None, resume=False, outputFrameRate=None, outputHeight=None,
+                 returnAudioRate=None):
+        if renderer not in ("jpeg","pipe","filtergraph"):
+            raise ValueError(f"unknown renderer '{renderer}'")
+        if (outputFrameRate or outputHeight) and renderer != "filtergraph":
+            raise ValueError("outputFrameRate and outputHeight need the filtergraph renderer")
+        self.silentThreshold = silentThreshold
+        self.newSpeed = [silentSpeed, soundedSpeed]
+        self.frameMargin = frameMargin
+        self.sampleRate = sampleRate # None keeps the input's own sample rate
+        self.frameRate = frameRate # only used if the input's frame rate can't be probed
+        self.frameQuality = frameQuality
+        self.renderer = renderer
+        self.workers = max(1,workers)
+        self.dropSilence = dropSilence or silentSpeed >= 999999
+        self.streamingAnalysis = streamingAnalysis
+        self.referenceLevel = referenceLevel
+        self.scratchFolder = scratchFolder # where per-run temp folders go, e.g. a tmpfs. Defaults to the system temp dir.
+        self.encodeSegments = max(1,encodeSegments) # concurrent ffmpeg encodes for the jpeg renderer's final stitch
+        self.preset = preset # x264 preset for the final encode, None keeps ffmpeg's default
+        self.profile = profile or cProfileFile is not None # record a StageProfile in JumpCutResult.profile
+        self.cProfileFile = cProfileFile # where to dump cProfile stats of the Python loops
+        self.resume = resume # keep extracted files in a folder keyed by the input's contents and reuse them on reruns
+        self.outputFrameRate = outputFrameRate # lower the output's frame rate to this, None keeps the input's
+        self.outputHeight = outputHeight # scale the output down to this height, None keeps the input's
+        self.returnAudioRate = returnAudioRate # also hand the new audio back in JumpCutResult.audio, e.g. 16000 for Whisper
+
+    def createTempFolder(self):
+        tempFolder = createTempFolder(self.scratchFolder)
+        if tempFolder is None:
+            raise JumpCutterError(f"Could not create a temporary directory in '{self.scratchFolder or tempfile.gettempdir()}'.")
+        return tempFolder
+
+    def workFolderFor(self, inputFile):
+        # Everything extracted depends only on the input's contents, the frame
+        # quality and the sample rate, so those make up the folder name.
+        logging.info(f"Hashing {inputFile} to find earlier work on it...")
+        key = hashlib.sha256(f"{hashFile(inputFile)}:q{self.frameQuality}:r{self.sampleRate}".encode()).hexdigest()
+        return os.path.join(self.scratchFolder or tempfile.gettempdir(),f"jumpcutter-work-{key[:24]}")
+
+    @contextmanager
+    def workFolder(self, inputFile):
+        # A fresh temp folder that is deleted afterwards, or with resume the
+        # input's own work folder, which is kept for the next run.
+        if not self.resume:
+            tempFolder = self.createTempFolder()
+            try:
+                yield tempFolder
+            finally:
+                logging.info(f"Cleaning up temporary files in {tempFolder}...")
+                deletePath(tempFolder)
+            return
+        tempFolder = self.workFolderFor(inputFile)
+        if not createPath(tempFolder):
+            raise JumpCutterError(f"Could not create work folder '{tempFolder}'.")
+        with lockFolder(tempFolder):
+            logging.info(f"Working in {tempFolder}, completed stages are kept for the next run.")
+            yield tempFolder
+
+    def openManifest(self, tempFolder):
+        return Manifest(tempFolder) if self.resume and tempFolder is not None else None
+
+    def createTimings(self):
+        return StageProfile(self.cProfileFile) if self.profile else {}
+
+    def createResult(self, outputFile, chunks, analysis, timings, audio=None):
+        profile = timings.report() if isinstance(timings,StageProfile) else None
+        pauses = outputPauses(chunks, self.newSpeed, analysis.frameRate)
+        return JumpCutResult(outputFile, chunks, analysis.frameRate, analysis.sampleRate, dict(timings), profile, audio, pauses)
+
+    def readOutputAudio(self, analysis, timings=None):
+        # The new audio track render() left in the temp folder, so whoever uses the
+        # result next (like Whisper) doesn't have to decode the output again.
+        if not self.returnAudioRate:
+            return None
+        with timed(timings,"resample_audio"):
+            if self.renderer == "filtergraph":
+                # Already mono at returnAudioRate, ffmpeg wrote it alongside the output
+                return np.fromfile(os.path.join(analysis.tempFolder,"audioCopy.f32"),dtype=np.float32)
+            _, audioData = wavfile.read(os.path.join(analysis.tempFolder,"audioNew.wav"),mmap=True)
+            return resampleMono(audioData,analysis.sampleRate,self.returnAudioRate)
+
+    def run(self, inputFile, outputFile=None):
+        if not os.path.exists(inputFile):
+            raise JumpCutterError(f"Input file '{inputFile}' not found.")
+        outputFile = outputFile if outputFile else inputToOutputFilename(inputFile)
+        timings = self.createTimings()
+        with self.workFolder(inputFile) as tempFolder:
+            analysis = self.analyze(inputFile, tempFolder, timings)
+            with timed(timings,"plan"):
+                chunks = self.planChunks(analysis)
+            self.render(analysis, chunks, outputFile, timings)
+            audio = self.readOutputAudio(analysis, timings)
+        return self.createResult(outputFile, chunks, analysis, timings, audio)
+
+    def analyze(self, inputFile, tempFolder, timings=None):
+        # tempFolder receives the extracted frames and audio and must stay around
+        # until render() is done with this analysis.
+        # The filtergraph renderer never touches the audio itself, so a streaming
+        # analysis can read it straight from an ffmpeg pipe without any WAV file.
+        pipedAnalysis = self.streamingAnalysis and self.renderer == "filtergraph"
+        manifest = self.openManifest(tempFolder)
+        analysisFile = os.path.join(tempFolder,"analysis.npz")
+        if manifest is not None and manifest.isDone("analysis"):
+            logging.info(f"Reusing the audio analysis of {inputFile} from an earlier run...")
+            return replace(loadEdl(analysisFile), inputFile=inputFile, tempFolder=tempFolder)
+
+        logging.info(f"Getting video parameters from {inputFile}...")
+        with timed(timings,"probe"):
+            mediaInfo = probeMedia(inputFile)
+        frameRate = float(mediaInfo.frameRate) if mediaInfo.frameRate else self.frameRate
+        sampleRate = int(self.sampleRate or mediaInfo.audioSampleRate or 44100)
+        frameSize = mediaInfo.displaySize() # portrait phone videos are stored sideways
+
+        if self.renderer == "pipe" and frameSize is None:
+            raise JumpCutterError(f"Could not find the frame size of {inputFile}, which the pipe renderer needs.")
+
+        audioData = None
+        if not pipedAnalysis:
+            self.extractAudio(inputFile, tempFolder, sampleRate, timings)
+            try:
+                # A memory map keeps the streaming analysis from pulling the whole
+                # track into memory. The renderers only touch one chunk at a time.
+                sampleRate, audioData = wavfile.read(os.path.join(tempFolder,"audio.wav"),mmap=self.streamingAnalysis)
+            except Exception as e:
+                raise JumpCutterError(f"Error reading audio data: {e}") from e
+
+        samplesPerFrame = sampleRate/frameRate
+        try:
+            with timed(timings,"analyze"):
+                if pipedAnalysis:
+                    logging.info(f"Analysing audio of {inputFile} through an ffmpeg pipe...")
+                    framePeaks = np.concatenate(list(iterFramePeaks(pipeBlocks(inputFile,sampleRate,2,ANALYSIS_BLOCK_SIZE),samplesPerFrame)))
+                elif self.streamingAnalysis:
+                    logging.info(f"Analysing audio in blocks of {ANALYSIS_BLOCK_SIZE} samples...")
+                    framePeaks = np.concatenate(list(iterFramePeaks(wavBlocks(os.path.join(tempFolder,"audio.wav"),ANALYSIS_BLOCK_SIZE),samplesPerFrame)))
+                else:
+                    framePeaks = getFramePeaks(audioData,samplesPerFrame)
+        except Exception as e:
+            raise JumpCutterError(f"Error analysing audio data: {e}") from e
+        # The loudest frame is the loudest sample, so no separate pass is needed for it.
+        maxAudioVolume = float(np.max(framePeaks))
+        analysis = Analysis(inputFile, tempFolder, frameRate, sampleRate, frameSize, framePeaks, maxAudioVolume, audioData)
+        if manifest is not None:
+            saveEdl(analysisFile, analysis, np.zeros((0,3),dtype=np.int64), self)
+            manifest.markDone("analysis")
+        return analysis
+
+    def extractFrames(self, inputFile, tempFolder, timings=None):
+        manifest = self.openManifest(tempFolder)
+        if manifest is not None:
+            if manifest.isDone("frames", self.frameQuality):
+                logging.info(f"Reusing frames of {inputFile} from an earlier run...")
+                return
+            manifest.begin("frames")
+        logging.info(f"Extracting frames from {inputFile}...")
+        command = ["ffmpeg","-y","-i",inputFile,"-qscale:v",str(self.frameQuality),os.path.join(tempFolder,'frame%06d.jpg'),"-hide_banner"]
+        try:
+            with timed(timings,"extract_frames"):
+                subprocess.run(command, check=True)
+        except Exception as e:
+            raise JumpCutterError(f"Error extracting frames: {e}") from e
+        if manifest is not None:
+            manifest.markDone("frames", self.frameQuality)
+
+    def extractAudio(self, inputFile, tempFolder, sampleRate, timings=None):
+        manifest = self.openManifest(tempFolder)
+        if manifest is not None:
+            if manifest.isDone("audio", sampleRate):
+                logging.info(f"Reusing audio of {inputFile} from an earlier run...")
+                return
+            manifest.begin("audio")
+        logging.info(f"Extracting audio from {inputFile}...")
+        command = ["ffmpeg","-y","-i",inputFile,"-ab","160k","-ac","2","-ar",str(sampleRate),"-vn",os.path.join(tempFolder,'audio.wav')]
+        try:
+            with timed(timings,"extract_audio"):
+                subprocess.run(command, check=True)
+        except Exception as e:
+            raise JumpCutterError(f"Error extracting audio: {e}") from e
+        if manifest is not None:
+            manifest.markDone("audio", sampleRate)
 
-        if leng < AUDIO_FADE_ENVELOPE_SIZE:
-            outputAudioData[outputPointer:endPointer] = 0 # audio is less than 0.01 sec, let's just remove it.
+    def analyzeOnly(self, inputFile, edlFile=None):
+        """
+        Analyses inputFile and writes the frame peaks and the chunk plan to an
+        edit decision list (.json or .npz) instead of rendering anything.
+
+        Returns:
+            str: Path to the EDL, by default next to the input as <name>.edl.json.
+        """
+        if not os.path.exists(inputFile):
+            raise JumpCutterError(f"Input file '{inputFile}' not found.")
+        edlFile = edlFile if edlFile else os.path.splitext(inputFile)[0]+".edl.json"
+        with self.workFolder(inputFile) as tempFolder:
+            analysis = self.analyze(inputFile, tempFolder)
+            saveEdl(edlFile, analysis, self.planChunks(analysis), self)
+        logging.info(f"Wrote edit decision list to {edlFile}")
+        return edlFile
+
+    def runFromEdl(self, edlFile, outputFile=None, inputFile=None):
+        """
+        Renders from an EDL written by analyzeOnly(). The chunks are planned again
+        from the cached frame peaks with this JumpCutter's settings, so changing the
+        threshold, margin or speeds does not need another analysis pass.
+        """
+        try:
+            analysis = loadEdl(edlFile)
+        except (OSError, ValueError, KeyError) as e:
+            raise JumpCutterError(f"Could not read edit decision list {edlFile}: {e}") from e
+        if inputFile is not None:
+            analysis = replace(analysis, inputFile=inputFile)
+        if not os.path.exists(analysis.inputFile):
+            raise JumpCutterError(f"Input file '{analysis.inputFile}' not found.")
+        outputFile = outputFile if outputFile else inputToOutputFilename(analysis.inputFile)
+        timings = self.createTimings()
+        with self.workFolder(analysis.inputFile) as tempFolder:
+            analysis = replace(analysis, tempFolder=tempFolder)
+            with timed(timings,"plan"):
+                chunks = self.planChunks(analysis)
+            self.render(analysis, chunks, outputFile, timings)
+            audio = self.readOutputAudio(analysis, timings)
+        return self.createResult(outputFile, chunks, analysis, timings, audio)
+
+    def preview(self, inputFile, outputFile=None, edlFile=None, height=360, frameRate=15):
+        """
+        Renders a small, fast proxy of the cut with the filtergraph renderer and
+        writes the chunk plan to an EDL, so the full render can follow with
+        runFromEdl() without analysing the input again.
+
+        Returns:
+            JumpCutResult: The preview. Its chunks are exactly the ones in the EDL.
+        """
+        if not os.path.exists(inputFile):
+            raise JumpCutterError(f"Input file '{inputFile}' not found.")
+        outputFile = outputFile if outputFile else inputToOutputFilename(inputFile).replace("_ALTERED","_PREVIEW")
+        edlFile = edlFile if edlFile else os.path.splitext(inputFile)[0]+".edl.json"
+        previewCutter = copy.copy(self)
+        previewCutter.renderer = "filtergraph"
+        previewCutter.preset = self.preset or "ultrafast"
+        previewCutter.outputFrameRate = frameRate
+        previewCutter.outputHeight = height
+        timings = previewCutter.createTimings()
+        with previewCutter.workFolder(inputFile) as tempFolder:
+            analysis = previewCutter.analyze(inputFile, tempFolder, timings)
+            with timed(timings,"plan"):
+                chunks = previewCutter.planChunks(analysis)
+            saveEdl(edlFile, analysis, chunks, self)
+            logging.info(f"Wrote edit decision list to {edlFile}, render the full version from it with --from_edl.")
+            previewCutter.render(analysis, chunks, outputFile, timings)
+        return previewCutter.createResult(outputFile, chunks, analysis, timings)
+
+    def sweep(self, inputFile=None, edlFile=None, thresholds=(0.01,0.02,0.03,0.05,0.08,0.1), margins=(0,1,2,3,5), soundedSpeeds=None, silentSpeeds=None):
+        """
+        Predicts output duration and number of cuts for a grid of settings from a
+        single analysis of inputFile, or from the peaks cached in edlFile.
+
+        Returns:
+            list: One dict per combination, see sweep(). pickSettings() picks one for a target duration.
+        """
+        if edlFile is not None:
+            try:
+                analysis = loadEdl(edlFile)
+            except (OSError, ValueError, KeyError) as e:
+                raise JumpCutterError(f"Could not read edit decision list {edlFile}: {e}") from e
+        else:
+            if not os.path.exists(inputFile):
+                raise JumpCutterError(f"Input file '{inputFile}' not found.")
+            with self.workFolder(inputFile) as tempFolder:
+                analysis = self.analyze(inputFile, tempFolder)
+        referenceVolume = self.referenceLevel*32768 if self.referenceLevel else analysis.maxAudioVolume
+        soundedSpeeds = soundedSpeeds if soundedSpeeds else [self.newSpeed[1]]
+        silentSpeeds = silentSpeeds if silentSpeeds else [self.newSpeed[0]]
+        return sweep(analysis.framePeaks,analysis.frameRate,referenceVolume,thresholds,margins,soundedSpeeds,silentSpeeds,self.dropSilence)
+
+    def planChunks(self, analysis):
+        referenceVolume = self.referenceLevel*32768 if self.referenceLevel else analysis.maxAudioVolume
+        chunks = getChunks(analysis.framePeaks,referenceVolume,self.silentThreshold,self.frameMargin)
+        if self.dropSilence:
+            # Silent chunks would be sped up to nothing anyway, so skip all audio and
+            # frame work for them.
+            chunks = chunks[chunks[:,2] == 1]
+            if len(chunks) == 0:
+                raise JumpCutterError(f"No sounded frames found in {analysis.inputFile}, nothing would be left.")
+        return chunks
+
+    def render(self, analysis, chunks, outputFile, timings=None):
+        tempFolder = analysis.tempFolder
+        if self.renderer == "filtergraph":
+            # Let a single ffmpeg process do the whole edit. No frames or time-stretched
+            # audio ever pass through Python.
+            logging.info(f"Rendering {len(chunks)} chunks into {outputFile} with one ffmpeg filtergraph...")
+            filterScript = os.path.join(tempFolder,"filtergraph.txt")
+            try:
+                with open(filterScript, "w") as f:
+                    f.write(buildFilterGraph(chunks,self.newSpeed,analysis.frameRate,analysis.sampleRate,AUDIO_FADE_ENVELOPE_SIZE,
+                        self.outputFrameRate,self.outputHeight,audioCopy=bool(self.returnAudioRate)))
+                command = ["ffmpeg","-y","-i",analysis.inputFile,"-filter_complex_script",filterScript,"-map","[outv]","-map","[outa]",
+                    *(["-preset",self.preset] if self.preset else []),"-strict","-2","-hide_banner",outputFile]
+                if self.returnAudioRate: # a second output from the same pass, for readOutputAudio()
+                    command += ["-map","[copya]","-ac","1","-ar",str(int(self.returnAudioRate)),"-f","f32le",os.path.join(tempFolder,'audioCopy.f32')]
+                with timed(timings,"encode"):
+                    subprocess.run(command, check=True)
+            except Exception as e:
+                raise JumpCutterError(f"Error rendering filtergraph: {e}") from e
+            return outputFile
+
+        # The new audio and the frame map only depend on the chunks and the
+        # analysis, so a resumed run with the same plan can skip straight to the frames.
+        manifest = self.openManifest(tempFolder)
+        planKey = hashlib.sha1(np.ascontiguousarray(chunks,dtype=np.int64).tobytes()+
+            repr((self.newSpeed,analysis.frameRate,analysis.sampleRate,analysis.maxAudioVolume)).encode()).hexdigest()
+        frameMapFile = os.path.join(tempFolder,"frameMap.npz")
+        if manifest is not None and manifest.isDone("stretch", planKey):
+            logging.info("Reusing time-altered audio from an earlier run with the same chunks...")
+            with np.load(frameMapFile) as data:
+                frameMap, chunkOutputFrames = data["frameMap"].tolist(), data["chunkOutputFrames"].tolist()
+        else:
+            if manifest is not None:
+                manifest.begin("stretch")
+            if analysis.audioData is None: # analysed through a pipe or loaded from an EDL
+                self.extractAudio(analysis.inputFile, tempFolder, analysis.sampleRate, timings)
+                try:
+                    sampleRate, audioData = wavfile.read(os.path.join(tempFolder,"audio.wav"),mmap=self.streamingAnalysis)
+                except Exception as e:
+                    raise JumpCutterError(f"Error reading audio data: {e}") from e
+                if sampleRate != analysis.sampleRate:
+                    raise JumpCutterError(f"Audio was analysed at {analysis.sampleRate} Hz but extracted at {sampleRate} Hz.")
+                analysis = replace(analysis, audioData=audioData)
+
+            with timed(timings,"stretch"):
+                outputAudioData, frameMap, chunkOutputFrames = self.alterAudio(analysis, chunks)
+            wavfile.write(os.path.join(tempFolder,"audioNew.wav"),analysis.sampleRate,outputAudioData)
+            if manifest is not None:
+                np.savez(frameMapFile, frameMap=np.array(frameMap,dtype=np.int64), chunkOutputFrames=np.array(chunkOutputFrames,dtype=np.int64))
+                manifest.markDone("stretch", planKey)
+
+        if self.renderer == "pipe":
+            logging.info(f"Piping time-altered frames into {outputFile}...")
+            try:
+                with timed(timings,"encode"):
+                    renderPiped(analysis.inputFile,outputFile,frameMap,analysis.frameSize,analysis.frameRate,os.path.join(tempFolder,"audioNew.wav"),self.preset)
+            except Exception as e:
+                raise JumpCutterError(f"Error piping video and audio: {e}") from e
         else:
-            premask = np.arange(AUDIO_FADE_ENVELOPE_SIZE)/AUDIO_FADE_ENVELOPE_SIZE
-            mask = np.repeat(premask[:, np.newaxis],2,axis=1) # make the fade-envelope mask stereo
-            outputAudioData[outputPointer:outputPointer+AUDIO_FADE_ENVELOPE_SIZE] *= mask
-            outputAudioData[endPointer-AUDIO_FADE_ENVELOPE_SIZE:endPointer] *= 1-mask
-
-        startOutputFrame = int(math.ceil(outputPointer/samplesPerFrame))
-        endOutputFrame = int(math.ceil(endPointer/samplesPerFrame))
-        for outputFrame in range(startOutputFrame, endOutputFrame):
-            inputFrame = int(chunk[0]+NEW_SPEED[int(chunk[2])]*(outputFrame-startOutputFrame))
-            didItWork = copyFrame(inputFrame,outputFrame,TEMP_FOLDER)
-            if didItWork:
-                lastExistingFrame = inputFrame
+            self.extractFrames(analysis.inputFile, tempFolder, timings)
+            if manifest is not None and manifest.isDone("frame_mapping", planKey):
+                logging.info("Reusing time-altered frames from an earlier run with the same chunks...")
             else:
-                copyFrame(lastExistingFrame,outputFrame,TEMP_FOLDER)
+                if manifest is not None:
+                    # A different plan may have left more frames behind, which the encoder would pick up.
+                    manifest.begin("frame_mapping")
+                    for staleFrame in glob.glob(os.path.join(tempFolder,"newFrame*.jpg")):
+                        os.remove(staleFrame)
+                with timed(timings,"frame_mapping"):
+                    lastExistingFrame = None
+                    for outputFrame, inputFrame in enumerate(frameMap):
+                        didItWork = copyFrame(inputFrame,outputFrame,tempFolder)
+                        if didItWork:
+                            lastExistingFrame = inputFrame
+                        else:
+                            copyFrame(lastExistingFrame,outputFrame,tempFolder)
+                if manifest is not None:
+                    manifest.markDone("frame_mapping", planKey)
 
-        outputPointer = endPointer
-    except Exception as e:
-        logging.error(f"Error processing audio chunk: {e}")
-        continue
+            splits = pickSegmentSplits(chunkOutputFrames,len(frameMap),self.encodeSegments)
+            if splits:
+                logging.info(f"Encoding {len(splits)+1} segments at once and joining them into {outputFile}...")
+                try:
+                    with timed(timings,"encode"):
+                        encodeSegments(tempFolder,len(frameMap),analysis.frameRate,splits,os.path.join(tempFolder,'audioNew.wav'),outputFile,self.preset)
+                except Exception as e:
+                    raise JumpCutterError(f"Error encoding segments: {e}") from e
+                return outputFile
 
-wavfile.write(os.path.join(TEMP_FOLDER,"audioNew.wav"),SAMPLE_RATE,outputAudioData)
+            # Stitch video and audio together
+            logging.info(f"Stitching video and audio together to create {outputFile}...")
+            command = ["ffmpeg","-y","-framerate",str(analysis.frameRate),"-i",os.path.join(tempFolder,'newFrame%06d.jpg'),"-i",os.path.join(tempFolder,'audioNew.wav'),
+                *(["-preset",self.preset] if self.preset else []),"-strict","-2",outputFile]
+            try:
+                with timed(timings,"encode"):
+                    subprocess.run(command, check=True)
+            except Exception as e:
+                raise JumpCutterError(f"Error stitching video and audio: {e}") from e
+        return outputFile
 
-# Stitch video and audio together
-logging.info(f"Stitching video and audio together to create {OUTPUT_FILE}...")
-command = f"ffmpeg -framerate {frameRate} -i {os.path.join(TEMP_FOLDER,'newFrame%06d.jpg')} -i {os.path.join(TEMP_FOLDER,'audioNew.wav')} -strict -2 {OUTPUT_FILE}"
-try:
-    subprocess.call(command, shell=True)
-except Exception as e:
-    logging.error(f"Error stitching video and audio: {e}")
-    deletePath(TEMP_FOLDER)
-    exit()
+    def alterAudio(self, analysis, chunks):
+        # Time-stretches every chunk's audio. Returns the new track, normalised to
+        # the loudest input sample, the input frame to show for every output frame
+        # and the output frame every chunk starts at.
+        audioData = analysis.audioData
+        maxAudioVolume = analysis.maxAudioVolume
+        samplesPerFrame = analysis.sampleRate/analysis.frameRate
+        # Every chunk's stretched audio fits in ceil(length/speed) samples, so the
+        # whole track gets one buffer up front and chunks are written straight into it.
+        chunkStarts = (chunks[:,0]*samplesPerFrame).astype(np.int64)
+        chunkEnds = (chunks[:,1]*samplesPerFrame).astype(np.int64)
+        chunkSpeeds = np.array(self.newSpeed,dtype=np.float64)[chunks[:,2]]
+        outputAudioData = np.zeros((int(np.sum(np.ceil((chunkEnds-chunkStarts)/chunkSpeeds))),audioData.shape[1]),dtype=np.float32)
+        outputPointer = 0
+        frameMap = [] # input frame to show for every output frame
+        chunkOutputFrames = [] # output frame every chunk starts at
+        premask = (np.arange(AUDIO_FADE_ENVELOPE_SIZE)/AUDIO_FADE_ENVELOPE_SIZE).astype(np.float32)[:, np.newaxis]
+
+        if self.workers > 1:
+            logging.info(f"Time-stretching {len(chunks)} chunks across {self.workers} processes...")
+            jobs = ((audioData[chunkStart:chunkEnd].astype(np.float32)/maxAudioVolume, speed) for chunkStart, chunkEnd, speed in zip(chunkStarts, chunkEnds, chunkSpeeds))
+            stretchedChunks = parallelMap(stretchChunk,jobs,self.workers)
 
-# Clean up temporary files
-logging.info(f"Cleaning up temporary files in {TEMP_FOLDER}...")
-deletePath(TEMP_FOLDER)
+        for chunk, chunkStart, chunkEnd, speed in zip(chunks, chunkStarts, chunkEnds, chunkSpeeds):
+            try:
+                if self.workers > 1:
+                    stretched = next(stretchedChunks).result()
+                    leng = stretched.shape[0]
+                    outputAudioData[outputPointer:outputPointer+leng] = stretched
+                else:
+                    audioChunk = audioData[chunkStart:chunkEnd].astype(np.float32)/maxAudioVolume
+                    leng = stretchAudio(audioChunk,speed,outputAudioData[outputPointer:])
+                endPointer = outputPointer+leng
+
+                if leng < AUDIO_FADE_ENVELOPE_SIZE:
+                    outputAudioData[outputPointer:endPointer] = 0 # audio is less than 0.01 sec, let's just remove it.
+                else:
+                    outputAudioData[outputPointer:outputPointer+AUDIO_FADE_ENVELOPE_SIZE] *= premask
+                    outputAudioData[endPointer-AUDIO_FADE_ENVELOPE_SIZE:endPointer] *= 1-premask
+
+                startOutputFrame = int(math.ceil(outputPointer/samplesPerFrame))
+                endOutputFrame = int(math.ceil(endPointer/samplesPerFrame))
+                chunkOutputFrames.append(startOutputFrame)
+                for outputFrame in range(startOutputFrame, endOutputFrame):
+                    frameMap.append(int(chunk[0]+speed*(outputFrame-startOutputFrame)))
+
+                outputPointer = endPointer
+            except Exception as e:
+                logging.error(f"Error processing audio chunk: {e}")
+                continue
+
+        return outputAudioData[:outputPointer], frameMap, chunkOutputFrames
+
+def jumpcut(inputFile, outputFile=None, **settings):
+    """
+    Runs a whole jumpcut in this process and returns a JumpCutResult.
+
+    Args:
+        inputFile (str): Path to the video file.
+        outputFile (str): Where to write the result. Defaults to inputFile with _ALTERED appended.
+        **settings: Any JumpCutter setting, e.g. silentThreshold or renderer.
+    """
+    return JumpCutter(**settings).run(inputFile, outputFile)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Modifies a video file to play at different speeds when there is sound vs. silence.')
+    parser.add_argument('--input_file', type=str,  help='the video file you want modified. (defaults to original-video.mp4, or the file named in --from_edl)', default=None)
+    parser.add_argument('--url', type=str, help='A youtube url to download and process')
+    parser.add_argument('--output_file', type=str, default=None, help="the output file. (optional. if not included, it'll just modify the input file name)")
+    parser.add_argument('--silent_threshold', type=float, default=0.03, help="the volume amount that frames' audio needs to surpass to be consider \"sounded\". It ranges from 0 (silence) to 1 (max volume)")
+    parser.add_argument('--sounded_speed', type=float, default=1.00, help="the speed that sounded (spoken) frames should be played at. Typically 1.")
+    parser.add_argument('--silent_speed', type=float, default=5.00, help="the speed that silent frames should be played at. 999999 for jumpcutting.")
+    parser.add_argument('--frame_margin', type=float, default=1, help="some silent frames adjacent to sounded frames are included to provide context. How many frames on either the side of speech should be included? That's this variable.")
+    parser.add_argument('--sample_rate', type=int, default=None, help="sample rate of the output video's audio. (optional. if not included, the input's sample rate is kept)")
+    parser.add_argument('--frame_rate', type=float, default=30, help="frame rate of the input and output videos. optional... it is read with ffprobe, this is only used if that fails.")
+    parser.add_argument('--frame_quality', type=int, default=3, help="quality of frames to be extracted from input video. 1 is highest, 31 is lowest, 3 is the default.")
+    parser.add_argument('--drop_silence', action='store_true', help="cut silent parts out entirely instead of speeding them up. This is the fastest mode, and is also used whenever --silent_speed is 999999 or more.")
+    parser.add_argument('--streaming_analysis', action='store_true', help="analyse the audio block by block instead of loading the whole track into memory. Meant for multi-hour recordings.")
+    parser.add_argument('--reference_level', type=float, default=None, help="volume that --silent_threshold is relative to, from 0 to 1. (optional. if not included, the loudest sample of the input is used)")
+    parser.add_argument('--scratch_dir', type=str, default=None, help="directory to create this run's temporary folder in, e.g. a tmpfs like /dev/shm. (optional. defaults to the system temp directory)")
+    parser.add_argument('--analyze_only', '--analyze-only', action='store_true', help="only analyse the input and write an edit decision list (see --edl_file) that --from_edl can render later")
+    parser.add_argument('--edl_file', type=str, default=None, help="where --analyze_only writes the edit decision list. .npz for a binary file, anything else is JSON. (optional. defaults to <input name>.edl.json)")
+    parser.add_argument('--from_edl', '--from-edl', type=str, default=None, help="render from an edit decision list written by --analyze_only instead of analysing the input again. Threshold, margin and speed flags still apply.")
+    parser.add_argument('--sweep', type=str, nargs='?', const="0.01,0.02,0.03,0.05,0.08,0.1", default=None, metavar="THRESHOLDS", help="instead of rendering, print the predicted output duration and number of cuts as JSON for every combination of these comma-separated thresholds (default 0.01,0.02,0.03,0.05,0.08,0.1) and the --sweep_margins and --sweep_speeds values. Works with --from_edl too.")
+    parser.add_argument('--sweep_margins', type=str, default="0,1,2,3,5", help="comma-separated frame margins for --sweep")
+    parser.add_argument('--sweep_speeds', type=str, default=None, help="comma-separated silent speeds for --sweep. (optional. defaults to --silent_speed)")
+    parser.add_argument('--target_duration', type=float, default=None, help="with --sweep, also print the combination that comes closest to this many seconds without going over")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes to time-stretch audio chunks with. 1 (the default) does it all in this process.")
+    parser.add_argument('--encode_segments', type=int, default=1, help="with the jpeg renderer, split the final encode at chunk boundaries into this many segments, encode them at the same time and join them without re-encoding. 1 (the default) encodes everything in one go.")
+    parser.add_argument('--preset', type=str, default=None, help="x264 preset for the final encode, e.g. ultrafast or slow. (optional. defaults to ffmpeg's own default)")
+    parser.add_argument('--profile', type=str, nargs='?', const="-", default=None, metavar="REPORT_FILE", help="record wall and CPU time, bytes read and written and peak memory for every stage and write them as JSON to REPORT_FILE, or print them if no file is given")
+    parser.add_argument('--cprofile_file', type=str, default=None, help="also run the analysis, time-stretching and frame mapping loops under cProfile and dump the stats to this file, for pstats or snakeviz")
+    parser.add_argument('--resume', action='store_true', help="keep extracted audio, frames and the analysis in a work folder named after the input's contents, frame quality and sample rate, and reuse whatever an earlier run of the same input finished. The folder is left in --scratch_dir (or the system temp directory) afterwards.")
+    parser.add_argument('--preview', action='store_true', help="render a quick low-resolution proxy (<input name>_PREVIEW) with the same chunks as a full render, and write the edit decision list (see --edl_file) so the full render can follow with --from_edl")
+    parser.add_argument('--preview_height', type=int, default=360, help="height of the --preview render in pixels")
+    parser.add_argument('--preview_frame_rate', type=float, default=15, help="frame rate of the --preview render")
+    parser.add_argument('--renderer', type=str, default="jpeg", choices=["jpeg","pipe","filtergraph"], help="how the output is produced. 'jpeg' extracts every frame to the temp folder, 'pipe' streams raw frames between two ffmpeg processes without touching disk, 'filtergraph' renders the whole cut in a single ffmpeg process.")
+
+    args = parser.parse_args()
+
+    INPUT_FILE = args.input_file
+    if INPUT_FILE is None and args.from_edl is None:
+        INPUT_FILE = "original-video.mp4"
+    if args.url is not None:
+        INPUT_FILE = downloadFile(args.url)
+        if INPUT_FILE is None:
+            logging.error("Failed to download video from URL. Aborting.")
+            exit(1)
+
+    jumpCutter = JumpCutter(silentThreshold=args.silent_threshold, soundedSpeed=args.sounded_speed, silentSpeed=args.silent_speed,
+        frameMargin=args.frame_margin, sampleRate=args.sample_rate, frameRate=args.frame_rate, frameQuality=args.frame_quality,
+        renderer=args.renderer, workers=args.workers, dropSilence=args.drop_silence, streamingAnalysis=args.streaming_analysis,
+        referenceLevel=args.reference_level, scratchFolder=args.scratch_dir, encodeSegments=args.encode_segments, preset=args.preset,
+        profile=args.profile is not None, cProfileFile=args.cprofile_file, resume=args.resume)
+    try:
+        if args.sweep is not None:
+            parseList = lambda values: [float(v) for v in values.split(",") if v.strip()]
+            results = jumpCutter.sweep(INPUT_FILE, args.from_edl, parseList(args.sweep), parseList(args.sweep_margins),
+                silentSpeeds=parseList(args.sweep_speeds) if args.sweep_speeds else None)
+            output = {"results": results}
+            if args.target_duration is not None:
+                output["best"] = pickSettings(results, args.target_duration)
+            print(json.dumps(output, indent=2))
+            return
+        elif args.preview:
+            result = jumpCutter.preview(INPUT_FILE, args.output_file, args.edl_file, args.preview_height, args.preview_frame_rate)
+        elif args.analyze_only:
+            jumpCutter.analyzeOnly(INPUT_FILE, args.edl_file)
+            return
+        elif args.from_edl is not None:
+            result = jumpCutter.runFromEdl(args.from_edl, args.output_file, INPUT_FILE)
+        else:
+            result = jumpCutter.run(INPUT_FILE, args.output_file)
+    except JumpCutterError as e:
+        logging.error(f"{e} Aborting.")
+        exit(1)
+
+    logging.info(f"Successfully created {result.outputFile}")
+    if result.profile is not None:
+        report = json.dumps({"inputFile": INPUT_FILE, "outputFile": result.outputFile, **result.profile}, indent=2)
+        if args.profile in (None, "-"):
+            print(report)
+        else:
+            with open(args.profile, "w") as f:
+                f.write(report)
+            logging.info(f"Wrote profile report to {args.profile}")
 
-logging.info(f"Successfully created {OUTPUT_FILE}")
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,17 @@
 import asyncio
+import json
 from dotenv import load_dotenv
-import subprocess
+from dag import Dag
+from framesampler import sample_frames
+from jumpcutter import jumpcut
+from transcription import WHISPER_SAMPLE_RATE, get_transcription_service
 import os
 from openai import OpenAI
-import cv2
 import traceback
 
 load_dotenv()
 from crewai.flow.flow import Flow, listen, start
 import litellm
-import whisper
 
 
 class ExampleFlow():
@@ -26,11 +28,13 @@ class ExampleFlow():
     async def shorten_video(self, video_path):
         print("Shortening video...")
         try:
-            # Execute jumpcutter.py as a subprocess
-            command = f"python jumpcutter.py --input_file {video_path} --output_file shortened_video.mp4"
-            subprocess.run(command, shell=True, check=True, capture_output=True)
-            self.state["shortened_video"] = "shortened_video.mp4"
-            return "shortened_video.mp4"
+            # Run jumpcutter in this process, no need for a fresh interpreter
+            # Keep the new audio in memory at Whisper's rate, so transcription doesn't decode it again
+            result = jumpcut(video_path, "shortened_video.mp4", returnAudioRate=WHISPER_SAMPLE_RATE)
+            self.state["shortened_video"] = result.outputFile
+            self.state["shortened_audio"] = result.audio
+            self.state["shortened_pauses"] = result.pauses
+            return result.outputFile
         except Exception as e:
             print(f"Error shortening video: {e}")
             traceback.print_exc()
@@ -42,8 +46,12 @@ class ExampleFlow():
             print("Skipping transcription because video_path is None")
             return None
         try:
-            model = whisper.load_model("base")
-            result = model.transcribe(video_path)
+            # Loaded once per process and shared by every transcription
+            # With WHISPER_PROCESSES set, long audio is cut at the pauses jumpcutter found
+            audio, pauses = self.state.get("shortened_audio"), self.state.get("shortened_pauses")
+            if audio is None or video_path != self.state.get("shortened_video"):
+                audio, pauses = video_path, None
+            result = get_transcription_service().transcribe(audio, pauses=pauses)
             text = result["text"]
             self.state["transcript"] = text
             return text
@@ -70,29 +78,12 @@ class ExampleFlow():
             return None
 
 
-    async def generate_photos(self, blog_post):
+    async def generate_photos(self, video_path):
         print("Generating photos...")
-        video_path = "orignal-video.mp4"
         output_dir = "photos"
         try:
-            os.makedirs(output_dir, exist_ok=True)
-            vidcap = cv2.VideoCapture(video_path)
-            if not vidcap.isOpened():
-                print(f"Error: Could not open video file {video_path}")
-                return None
-            fps = vidcap.get(cv2.CAP_PROP_FPS)
-            # Extract one frame every 10 seconds
-            frame_interval = int(fps * 10)
-            success, image = vidcap.read()
-            count = 0
-            photo_paths = []
-            while success:
-                if count % frame_interval == 0:
-                    photo_path = os.path.join(output_dir, f"frame{count}.jpg")
-                    cv2.imwrite(photo_path, image)
-                    photo_paths.append(photo_path)
-                success, image = vidcap.read()
-                count += 1
+            # Seeks to one frame every 10 seconds instead of decoding the whole video
+            photo_paths = sample_frames(video_path, output_dir, interval_seconds=10)
             self.state["photo_paths"] = photo_paths
             return photo_paths
         except Exception as e:
@@ -146,12 +137,20 @@ class ExampleFlow():
 flow = ExampleFlow()
 
 async def main():
-    video_path = await flow.video_path()
-    shortened_video = await flow.shorten_video(video_path)
-    transcript = await flow.transcribe_video(shortened_video)
-    blog_post = await flow.create_blog_post(transcript)
-    photo_paths = await flow.generate_photos(blog_post)
-    html_path = await flow.create_html_blog_post(photo_paths)
-    print(f"Generated HTML blog post: {html_path}")
-
-asyncio.run(main())
+    # Photos come from the source video, so they are taken while it is shortened,
+    # transcribed and written up. The steps block, so they run in threads.
+    dag = Dag()
+    dag.add("video_path", flow.video_path)
+    dag.add("shortened_video", flow.shorten_video, "video_path", blocking=True)
+    dag.add("transcript", flow.transcribe_video, "shortened_video", blocking=True)
+    dag.add("blog_post", flow.create_blog_post, "transcript", blocking=True)
+    dag.add("photo_paths", flow.generate_photos, "video_path", blocking=True)
+    # The HTML reads the blog post from the flow's state, so it waits for it too
+    dag.add("html_path", lambda photo_paths, blog_post: flow.create_html_blog_post(photo_paths), "photo_paths", "blog_post")
+    results = await dag.run()
+    print(f"Generated HTML blog post: {results['html_path']}")
+    print(f"Step timings: {json.dumps(dag.report(), indent=2)}")
+
+# Guarded, because segmented transcription starts worker processes that import this file
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+import pytest
+
+from jumpcutter import getChunks, getFramePeaks, getMaxVolume
+
+
+def loopChunks(audioData, samplesPerFrame, silentThreshold, frameSpreadage):
+    # The per-frame loops getFramePeaks and getChunks replaced, as they were.
+    # Also returns shouldIncludeFrame so tests can tell where the last frame flips.
+    audioSampleCount = audioData.shape[0]
+    maxAudioVolume = getMaxVolume(audioData)
+    audioFrameCount = int(math.ceil(audioSampleCount/samplesPerFrame))
+    hasLoudAudio = np.zeros((audioFrameCount))
+
+    for i in range(audioFrameCount):
+        start = int(i*samplesPerFrame)
+        end = min(int((i+1)*samplesPerFrame),audioSampleCount)
+        audiochunks = audioData[start:end]
+        maxchunksVolume = float(getMaxVolume(audiochunks))/maxAudioVolume
+        if maxchunksVolume >= silentThreshold:
+            hasLoudAudio[i] = 1
+
+    chunks = [[0,0,0]]
+    shouldIncludeFrame = np.zeros((audioFrameCount))
+    for i in range(audioFrameCount):
+        start = int(max(0,i-frameSpreadage))
+        end = int(min(audioFrameCount,i+1+frameSpreadage))
+        shouldIncludeFrame[i] = np.max(hasLoudAudio[start:end])
+        if (i >= 1 and shouldIncludeFrame[i] != shouldIncludeFrame[i-1]): # Did we flip?
+            chunks.append([chunks[-1][1],i,shouldIncludeFrame[i-1]])
+
+    chunks.append([chunks[-1][1],audioFrameCount,shouldIncludeFrame[i-1]])
+    chunks = chunks[1:]
+    return [[int(start),int(end),int(sounded)] for start, end, sounded in chunks], shouldIncludeFrame
+
+
+def vectorChunks(audioData, samplesPerFrame, silentThreshold, frameSpreadage):
+    framePeaks = getFramePeaks(audioData,samplesPerFrame)
+    return getChunks(framePeaks,getMaxVolume(audioData),silentThreshold,frameSpreadage).tolist()
+
+
+def speechLikeAudio(rng, seconds, sampleRate):
+    # Stereo int16 noise with quiet stretches of random length, so the threshold
+    # and margin actually decide something.
+    sampleCount = int(seconds*sampleRate)
+    envelope = np.zeros(sampleCount)
+    position = 0
+    while position < sampleCount:
+        length = int(rng.uniform(0.02,0.6)*sampleRate)
+        envelope[position:position+length] = rng.choice([0.005,0.02,0.3,1.0])
+        position += length
+    noise = rng.uniform(-1,1,(sampleCount,2))*envelope[:,np.newaxis]
+    return (noise*20000).astype(np.int16)
+
+
+CASES = [
+    (seed, sampleRate, frameRate, threshold, margin)
+    for seed, (sampleRate, frameRate, threshold, margin) in enumerate([
+        (44100, 30, 0.03, 1),
+        (44100, 30000/1001, 0.03, 1),
+        (48000, 24000/1001, 0.05, 2),
+        (48000, 25, 0.1, 0),
+        (22050, 60000/1001, 0.02, 1.5),
+        (16000, 29.97, 0.08, 2.5),
+        (44100, 23.976, 0.01, 0.5),
+        (8000, 12.5, 0.5, 3),
+    ]*6)
+]
+
+
+@pytest.mark.parametrize("seed,sampleRate,frameRate,threshold,margin", CASES)
+def test_chunks_match_the_loops(seed, sampleRate, frameRate, threshold, margin):
+    rng = np.random.default_rng(seed)
+    audioData = speechLikeAudio(rng, rng.uniform(1,6), sampleRate)
+    samplesPerFrame = sampleRate/frameRate
+
+    expected, shouldIncludeFrame = loopChunks(audioData,samplesPerFrame,threshold,margin)
+    chunks = vectorChunks(audioData,samplesPerFrame,threshold,margin)
+
+    if len(shouldIncludeFrame) > 1 and shouldIncludeFrame[-1] != shouldIncludeFrame[-2]:
+        # The one known difference: the loop labelled the final one-frame chunk
+        # with the flag of the frame before it.
+        assert chunks[:-1] == expected[:-1]
+        assert chunks[-1][:2] == expected[-1][:2] == [len(shouldIncludeFrame)-1, len(shouldIncludeFrame)]
+        assert expected[-1][2] == chunks[-2][2]
+        assert chunks[-1][2] == int(shouldIncludeFrame[-1]) != chunks[-2][2]
+    else:
+        assert chunks == expected
+
+
+def test_last_frame_flip_gets_its_own_flag():
+    # 10 frames of 100 samples, only the last one loud
+    audioData = np.zeros((1000,2),dtype=np.int16)
+    audioData[950] = 10000
+    expected, _ = loopChunks(audioData,100,0.5,0)
+    chunks = vectorChunks(audioData,100,0.5,0)
+    assert expected == [[0,9,0],[9,10,0]]
+    assert chunks == [[0,9,0],[9,10,1]]
+
+
+def test_chunks_cover_every_frame():
+    rng = np.random.default_rng(1234)
+    audioData = speechLikeAudio(rng, 5, 44100)
+    samplesPerFrame = 44100/(30000/1001)
+    chunks = np.array(vectorChunks(audioData,samplesPerFrame,0.03,1.5))
+    assert chunks[0,0] == 0
+    assert chunks[-1,1] == math.ceil(audioData.shape[0]/samplesPerFrame)
+    assert (chunks[1:,0] == chunks[:-1,1]).all()
+    assert (chunks[1:,2] != chunks[:-1,2]).all()
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from transcription import MIN_SEGMENT_SECONDS, WHISPER_SAMPLE_RATE, split_at_pauses
+
+
+def noise(seconds, seed=0):
+    return np.random.default_rng(seed).normal(size=int(seconds*WHISPER_SAMPLE_RATE)).astype(np.float32)
+
+
+@pytest.mark.parametrize("seconds,max_seconds,pauses", [
+    (121, 60, []),
+    (241, 60, list(np.arange(7, 241, 9.3))),
+    (241, 60, []),
+    (130, 120, []),
+    (500, 120, [13.5, 61.2, 99.9, 170.4, 230.0, 301.7, 360.2, 420.8, 488.1]),
+])
+def test_pieces_stay_within_the_limits(seconds, max_seconds, pauses):
+    audio = noise(seconds)
+    ranges = split_at_pauses(audio, pauses, max_seconds)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(audio)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    lengths = [(end-start)/WHISPER_SAMPLE_RATE for start, end in ranges]
+    assert min(lengths) >= MIN_SEGMENT_SECONDS
+    assert max(lengths) <= max_seconds
+
+
+def test_short_audio_stays_one_piece():
+    audio = noise(10)
+    assert split_at_pauses(audio, [5.0], 60) == [(0, len(audio))]
+
+
+def test_short_tail_is_joined_when_it_cannot_be_rebalanced():
+    audio = noise(35)
+    assert split_at_pauses(audio, [], 30) == [(0, len(audio))]
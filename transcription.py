@@ -0,0 +1,323 @@
+import bisect
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Overridable per deployment, e.g. WHISPER_MODEL=small WHISPER_POOL_SIZE=2
+DEFAULT_MODEL = os.getenv("WHISPER_MODEL", "base")
+DEFAULT_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", "1"))
+# Worker processes for segmented transcription. 0 or 1 transcribes in this process.
+DEFAULT_PROCESSES = int(os.getenv("WHISPER_PROCESSES", "0"))
+
+# Segmented transcription cuts audio into pieces no longer than this, and no
+# shorter than MIN_SEGMENT_SECONDS unless the audio is, so Whisper keeps enough
+# context. See split_at_pauses for when the last piece may run over.
+MAX_SEGMENT_SECONDS = 120
+MIN_SEGMENT_SECONDS = 20
+
+# What Whisper expects arrays to be sampled at. Pass it as jumpcut()'s returnAudioRate
+# to get the shortened audio back ready to transcribe.
+WHISPER_SAMPLE_RATE = 16000
+
+
+def quietest_sample(audio: np.ndarray, start: int, end: int, window: int = WHISPER_SAMPLE_RATE // 50) -> int:
+    """The middle of the quietest window-long stretch of audio[start:end]."""
+    start, end = max(0, start), min(len(audio), end)
+    count = (end - start) // window
+    if count < 1:
+        return (start + end) // 2
+    energy = np.square(audio[start : start + count * window], dtype=np.float32).reshape(count, window).sum(axis=1)
+    return start + int(np.argmin(energy)) * window + window // 2
+
+
+def split_at_pauses(
+    audio: np.ndarray,
+    pauses: Sequence[float],
+    max_seconds: float,
+    sample_rate: int = WHISPER_SAMPLE_RATE,
+    min_seconds: float = MIN_SEGMENT_SECONDS,
+) -> List[Tuple[int, int]]:
+    """
+    Cuts audio into pieces no longer than max_seconds and no shorter than
+    min_seconds, as close to each limit as a pause allows.
+
+    Args:
+        audio: Mono samples.
+        pauses: Seconds into the audio where speech pauses, like a JumpCutResult's
+            pauses. Every one is moved to the quietest point within a quarter
+            second of it. Where no pause falls late enough in a piece, the piece
+            ends at the quietest point of its last second.
+        min_seconds: A shorter last piece is split off the one before it
+            further back, or joined to it where the two don't make two pieces of
+            at least min_seconds, which can then run up to min_seconds over
+            max_seconds. Audio shorter than min_seconds stays one piece.
+
+    Returns:
+        list: [start, end) sample ranges that cover the whole audio, in order.
+    """
+    max_samples = max(sample_rate, int(max_seconds * sample_rate))
+    # a piece always ends in the last second before its limit if no pause comes earlier
+    min_samples = max(0, min(int(min_seconds * sample_rate), max_samples - sample_rate))
+    reach = sample_rate // 4
+    cuts = sorted(quietest_sample(audio, int(p * sample_rate) - reach, int(p * sample_rate) + reach) for p in pauses)
+
+    def last_pause_or_quietest(first: int, last: int) -> int:
+        i = bisect.bisect_right(cuts, last)
+        if i > 0 and cuts[i - 1] > first:
+            return cuts[i - 1]
+        return quietest_sample(audio, max(first, last - sample_rate), last)
+
+    ranges = []
+    start = 0
+    while len(audio) - start > max_samples:
+        end = last_pause_or_quietest(start + max(max_samples // 2, min_samples), start + max_samples)
+        ranges.append((start, end))
+        start = end
+    if ranges and len(audio) - start < min_samples:
+        # Whisper makes things up on very short clips, so don't hand it a short tail
+        start, _ = ranges.pop()
+        first = max(start + min_samples, len(audio) - max_samples)
+        last = min(start + max_samples, len(audio) - min_samples)
+        if len(audio) - start > max_samples and first <= last:
+            end = last_pause_or_quietest(first, last)
+            ranges.append((start, end))
+            start = end
+    ranges.append((start, len(audio)))
+    return ranges
+
+
+def stitch_results(parts: List[Tuple[float, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Joins Whisper results of consecutive pieces of audio into one, moving every
+    segment's (and word's) times by the offset in seconds its piece started at.
+    """
+    segments = []
+    for offset, result in parts:
+        for segment in result["segments"]:
+            segment = dict(segment, id=len(segments), start=segment["start"] + offset, end=segment["end"] + offset)
+            if "seek" in segment:
+                segment["seek"] += int(round(offset * 100))  # in 10 ms mel frames
+            if "words" in segment:
+                segment["words"] = [dict(word, start=word["start"] + offset, end=word["end"] + offset) for word in segment["words"]]
+            segments.append(segment)
+    return {
+        "text": "".join(result["text"] for _, result in parts),
+        "segments": segments,
+        "language": parts[0][1].get("language") if parts else None,
+    }
+
+
+# Each worker process of a segmented transcription loads its own copy of the model once
+_worker_model = None
+
+
+def _load_worker_model(model_name: str, device: Optional[str], threads: int):
+    global _worker_model
+    import torch
+    import whisper
+
+    # Workers share the cores instead of each starting a thread per core
+    torch.set_num_threads(threads)
+    _worker_model = whisper.load_model(model_name, device=device)
+
+
+def _transcribe_in_worker(audio: np.ndarray, options: Dict[str, Any]) -> Dict[str, Any]:
+    return _worker_model.transcribe(audio, **options)
+
+
+class TranscriptionService:
+    """
+    Loads a Whisper model once and runs every transcription in the process
+    through it, so requests only pay for inference.
+
+    A Whisper model can't transcribe two things at once, so pool_size copies are
+    loaded and every call borrows one. With the default of 1, calls are
+    serialized. Each extra copy costs the model's weights in memory again.
+
+    With processes above 1, no model is loaded in this process. Audio is cut at
+    pauses instead and the pieces are transcribed by that many worker
+    processes, each with its own model, so one long transcription uses every
+    core. Whisper doesn't see the text of the piece before, which can cost a
+    little accuracy right after a cut.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        device: Optional[str] = None,
+        processes: int = DEFAULT_PROCESSES,
+    ):
+        self.model_name = model_name
+        self.pool_size = max(1, pool_size)
+        self.device = device  # None lets Whisper pick cuda if it is available
+        self.processes = processes if processes > 1 else 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._models: queue.Queue = queue.Queue()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "load_seconds": None,
+            "warm_up_seconds": None,
+            "transcriptions": 0,
+            "inference_seconds": 0.0,
+            "busy": 0,
+            "segments": 0,
+        }
+        self._parameter_bytes = 0
+
+    def load(self):
+        """Loads the model copies (or starts the worker processes) if that hasn't happened yet. Safe to call from any thread."""
+        with self._load_lock:
+            if self._loaded:
+                return
+            if self.processes:
+                print(f"Starting {self.processes} Whisper processes with model '{self.model_name}'...")
+                threads = max(1, (os.cpu_count() or 1) // self.processes)
+                self._executor = ProcessPoolExecutor(
+                    self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),  # forking a process that has torch loaded isn't safe
+                    initializer=_load_worker_model,
+                    initargs=(self.model_name, self.device, threads),
+                )
+                self._loaded = True
+                return
+            import whisper
+
+            print(f"Loading Whisper model '{self.model_name}' ({self.pool_size} copies)...")
+            start = time.perf_counter()
+            for _ in range(self.pool_size):
+                model = whisper.load_model(self.model_name, device=self.device)
+                self._models.put(model)
+            self._parameter_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+            self._stats["load_seconds"] = time.perf_counter() - start
+            self._loaded = True
+
+    def warm_up(self):
+        """
+        Loads the models and runs every copy once on a second of silence, so the
+        first real request doesn't pay for lazy initialisation either.
+        """
+        self.load()
+        start = time.perf_counter()
+        silence = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+        if self._executor is not None:
+            # Submitted together, so every worker gets started and loads its model
+            futures = [self._executor.submit(_transcribe_in_worker, silence, {"fp16": False}) for _ in range(self.processes)]
+            for future in futures:
+                future.result()
+            self._stats["warm_up_seconds"] = time.perf_counter() - start
+            return
+        models = [self._models.get() for _ in range(self.pool_size)]
+        try:
+            for model in models:
+                model.transcribe(silence, fp16=False)
+        finally:
+            for model in models:
+                self._models.put(model)
+        self._stats["warm_up_seconds"] = time.perf_counter() - start
+
+    def transcribe(self, audio, pauses: Optional[Sequence[float]] = None, **options) -> Dict[str, Any]:
+        """
+        Transcribes audio with one of the loaded models, waiting for a free one.
+
+        Args:
+            audio: Path to a media file, or a float32 NumPy array of 16 kHz mono samples.
+            pauses: Seconds into the audio where speech pauses, e.g. a JumpCutResult's
+                pauses. Segmented transcription cuts there. Optional.
+            **options: Passed on to Whisper's transcribe(), e.g. language="en".
+
+        Returns:
+            dict: Whisper's result, with "text" and "segments".
+        """
+        self.load()
+        if self._executor is not None:
+            return self._transcribe_segments(audio, pauses or [], options)
+        model = self._models.get()
+        with self._stats_lock:
+            self._stats["busy"] += 1
+        start = time.perf_counter()
+        try:
+            return model.transcribe(audio, **options)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._models.put(model)
+            with self._stats_lock:
+                self._stats["busy"] -= 1
+                self._stats["transcriptions"] += 1
+                self._stats["inference_seconds"] += elapsed
+
+    def _transcribe_segments(self, audio, pauses: Sequence[float], options: Dict[str, Any]) -> Dict[str, Any]:
+        if isinstance(audio, str):
+            import whisper
+
+            audio = whisper.load_audio(audio)
+        # Short enough that every worker gets a piece, long enough to keep context
+        seconds = len(audio) / WHISPER_SAMPLE_RATE
+        max_seconds = min(MAX_SEGMENT_SECONDS, max(MIN_SEGMENT_SECONDS, seconds / self.processes))
+        ranges = split_at_pauses(audio, pauses, max_seconds)
+        with self._stats_lock:
+            self._stats["busy"] += 1
+        start = time.perf_counter()
+        try:
+            futures = [self._executor.submit(_transcribe_in_worker, audio[first:last], options) for first, last in ranges]
+            return stitch_results([(first / WHISPER_SAMPLE_RATE, future.result()) for (first, _), future in zip(ranges, futures)])
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self._stats["busy"] -= 1
+                self._stats["transcriptions"] += 1
+                self._stats["segments"] += len(ranges)
+                self._stats["inference_seconds"] += elapsed
+
+    def close(self):
+        """Stops the worker processes, if there are any."""
+        with self._load_lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+                self._loaded = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Load and warm-up times, inference totals and memory use, as a JSON-friendly dict."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(
+            {
+                "model": self.model_name,
+                "pool_size": self.pool_size,
+                "processes": self.processes,
+                "loaded": self._loaded,
+                "parameter_bytes": self._parameter_bytes * self.pool_size,
+                "process_peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+        )
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                stats["cuda_allocated_bytes"] = torch.cuda.memory_allocated()
+                stats["cuda_peak_allocated_bytes"] = torch.cuda.max_memory_allocated()
+        except ImportError:
+            pass
+        return stats
+
+
+_services: Dict[str, TranscriptionService] = {}
+_services_lock = threading.Lock()
+
+
+def get_transcription_service(model_name: str = DEFAULT_MODEL) -> TranscriptionService:
+    """Returns this process's service for model_name, creating it on first use."""
+    with _services_lock:
+        if model_name not in _services:
+            _services[model_name] = TranscriptionService(model_name)
+        return _services[model_name]